@@ -0,0 +1,160 @@
+from os import environ
+from time import time
+from functools import partial
+from os.path import isdir
+from argparse import ArgumentParser, Namespace
+from typing import Any, Dict, List, Optional
+from subprocess import run as runsubprocess, CompletedProcess, DEVNULL
+from loggers import muted
+from errors import CommandFailed, InvalidArguments
+from helpers import initcommands, validateargs
+from pipeline import Pipeline, PipelineStep, getsteps
+
+'''
+library entry point: runs the same pipeline as the cli on any repo, without output or exit().
+
+    from api import PipelineOptions, run
+    results = run(PipelineOptions("path/to/repo", message="update", pull=True))
+
+commands run with cwd=repo and nothing touches process-wide state,
+so several threads can each run a pipeline on a different repo
+'''
+
+# the cli's defaults, so options the api doesn't expose behave exactly as when they're left out on the command line
+_parser: ArgumentParser = ArgumentParser(add_help=False)
+initcommands(_parser)
+DEFAULTS: Dict[str, Any] = vars(_parser.parse_args([]))
+del _parser
+
+class PipelineOptions:
+    '''
+    what to run, the library version of meow's flags. only steps that are plain git commands are supported,
+    the cli-only features (--push-to, --check, --preflight, --coordinate, --ssh-mux, ...) stay off
+    '''
+    def __init__(
+            self,
+            repo: str,
+            message: Optional[str] = None,
+            add: Optional[List[str]] = None,
+            nomsg: bool = False,
+            allowempty: bool = False,
+            amend: bool = False,
+            status: bool = False,
+            updatesubmodules: bool = False,
+            stash: bool = False,
+            pull: bool = False,
+            norebase: bool = False,
+            diff: bool = False,
+            upstream: Optional[List[str]] = None,
+            force: bool = False,
+            tags: bool = False,
+            nopush: bool = False,
+            cont: bool = False,
+            env: Optional[Dict[str, str]] = None
+            ):
+        self.repo = repo
+        self.message = message
+        self.add = add # files to stage, everything when None
+        self.nomsg = nomsg
+        self.allowempty = allowempty
+        self.amend = amend
+        self.status = status
+        self.updatesubmodules = updatesubmodules
+        self.stash = stash
+        self.pull = pull
+        self.norebase = norebase
+        self.diff = diff
+        self.upstream = upstream # [REMOTE, BRANCH] or [REMOTE/BRANCH]
+        self.force = force
+        self.tags = tags
+        self.nopush = nopush
+        self.cont = cont # keep going after a failed step instead of raising CommandFailed
+        self.env = env # extra environment variables for the git commands
+
+    def toargs(self) -> Namespace:
+        '''the Namespace the cli would have parsed for these options'''
+        return Namespace(**{
+            **DEFAULTS,
+            "message": [self.message] if self.message else [],
+            "add": self.add,
+            "nomsg": self.nomsg,
+            "allowempty": self.allowempty,
+            "amend": self.amend,
+            "status": self.status,
+            "updatesubmodules": self.updatesubmodules,
+            "stash": self.stash,
+            "pull": self.pull,
+            "norebase": self.norebase,
+            "diff": self.diff,
+            "upstream": self.upstream,
+            "force": self.force,
+            "tags": self.tags,
+            "nopush": self.nopush,
+            "cont": self.cont,
+            "quiet": True,
+        })
+
+class StepResult:
+    '''what one step ran and what came out of it'''
+    def __init__(self, step: str, command: List[str], returncode: int, stdout: bytes, stderr: bytes, duration: float):
+        self.step = step
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        '''whether the command exited with 0'''
+        return self.returncode == 0
+
+    def __repr__(self) -> str:
+        return f"StepResult(step={self.step!r}, returncode={self.returncode}, duration={self.duration:.4f})"
+
+def _runinrepo(
+        cmd: List[str],
+        flags: Namespace,
+        pbar: None = None,
+        withprogress: bool = True,
+        *,
+        step: str,
+        repo: str,
+        env: Dict[str, str],
+        results: List[StepResult]
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''private runner for api steps: runs cmd in repo, records it, and raises instead of exiting'''
+    if not cmd:
+        return None
+    start: float = time()
+    result: CompletedProcess[bytes] = runsubprocess(cmd, cwd=repo, env=env, stdin=DEVNULL, check=False, capture_output=True)
+    results.append(StepResult(step, cmd, result.returncode, result.stdout, result.stderr, time() - start))
+    if result.returncode != 0 and not flags.cont:
+        raise CommandFailed(step, cmd, result.returncode, result.stdout, result.stderr, list(results))
+    return result
+
+def run(options: PipelineOptions) -> List[StepResult]:
+    '''
+    runs the pipeline described by options and returns a result per command that ran.
+    raises InvalidArguments, before anything runs, for options that can't work together, CommandFailed when a step fails
+    '''
+    if not isdir(options.repo):
+        raise InvalidArguments(f"{options.repo} is not a directory")
+    args: Namespace = options.toargs()
+    validateargs(args)
+
+    # never wait for a credential prompt or an editor nobody will see
+    env: Dict[str, str] = {**environ, "GIT_TERMINAL_PROMPT": "0", "GIT_EDITOR": "true", **(options.env or {})}
+    results: List[StepResult] = []
+    with muted():
+        steps: List[PipelineStep] = [
+            PipelineStep(
+                step.name,
+                step.func,
+                nopbar=step.nopbar,
+                runner=partial(_runinrepo, step=step.name, repo=options.repo, env=env, results=results)
+            )
+            for step in getsteps(args)
+        ]
+        Pipeline(args, steps, None).run()
+    return results
@@ -0,0 +1,65 @@
+from sys import argv
+from shlex import split
+from time import perf_counter
+from timeit import repeat
+from statistics import median
+from subprocess import run, DEVNULL
+from typing import List, Callable
+from reports import StepReport, formatreport
+from loggers import parsenumstat, classifyoutput
+import loggers
+
+'''
+benchmarks for the cython hot paths.
+run it once from the source tree and once next to the built .so files to compare:
+    python bench.py [number]
+
+startup time of build flavors (or any command), e.g. after `./build.sh onefile && ./build.sh onedir`:
+    python bench.py startup dist/onefile/meow dist/onedir/meow/meow "python main.py"
+'''
+
+def bench(name: str, func: Callable[[], object], number: int) -> None:
+    '''prints the best per-call time of func'''
+    best: float = min(repeat(func, number=number, repeat=5)) / number
+    print(f"  {name:<16} {best * 1e6:10.2f} us/call")
+
+def benchstartup(commands: List[str], runs: int = 20) -> None:
+    '''prints how long each command takes to start and exit, using the cheapest meow invocation'''
+    for command in commands:
+        cmd: List[str] = split(command) + ["meow"]
+        run(cmd, stdout=DEVNULL, stderr=DEVNULL) # warm the page cache
+        times: List[float] = []
+        for _ in range(runs):
+            start: float = perf_counter()
+            run(cmd, stdout=DEVNULL, stderr=DEVNULL)
+            times.append(perf_counter() - start)
+        print(f"  {command:<32} min {min(times) * 1000:8.1f} ms   median {median(times) * 1000:8.1f} ms")
+
+def main() -> None:
+    if len(argv) > 2 and argv[1] == "startup":
+        print("startup time (`meow meow`):")
+        benchstartup(argv[2:])
+        return
+
+    compiled: bool = loggers.__file__.endswith((".so", ".pyd"))
+    print(f"compiled: {compiled}")
+
+    numstat: str = "\n".join(f"{i % 97}\t{i % 13}\tsrc/module{i}/file{i}.py" for i in range(5000))
+    outputs: List[str] = [
+        "Everything up-to-date",
+        "On branch main\nnothing to commit, working tree clean",
+        "[main 4c25dba] switch v1\n 1 file changed, 14 insertions(+)\n create mode 100644 a.py",
+        "[main 4c25dba] switch v1\n 1 file changed, 14 insertions(+), 31 deletions(-)",
+    ]
+    report: List[StepReport] = [
+        StepReport(step=f"step {i}", command="git push", duration=i / 7, output="ok\n" * 5, returncode=i % 2)
+        for i in range(200)
+    ]
+
+    number: int = int(argv[1]) if len(argv) > 1 else 200
+    bench("parsenumstat", lambda: parsenumstat(numstat), number)
+    bench("classifyoutput", lambda: [classifyoutput(output, False, "switch v1") for output in outputs], number * 100)
+    bench("formatreport", lambda: formatreport(report, 3.0), number)
+
+if __name__ == "__main__":
+    main()
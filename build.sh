@@ -1,7 +1,22 @@
 #!/bin/bash
 set -euo pipefail
 
-rm -rf temp dist
+# usage: ./build.sh [onefile|onedir]
+#   onefile: a single executable, unpacks itself to a temp dir on every run
+#   onedir:  a directory installed once to /usr/lib/meow, starts without unpacking anything
+FLAVOR="${1:-onefile}"
+if [[ "$FLAVOR" != "onefile" && "$FLAVOR" != "onedir" ]]; then
+    echo "error: unknown build flavor $FLAVOR (use onefile or onedir)"
+    exit 1
+fi
+
+# compiled modules, keep in sync with MODULES in setup.py
+MODULES=(loaders loggers errors reports helpers network clone prefetch watcher tune sshmux checks preflight checkpoint maintenance coordinator pipeline githandler main api)
+
+# stdlib modules meow never imports, left out to shrink the bundle and the import work at startup
+EXCLUDED_MODULES=(tkinter unittest pytest pydoc doctest pdb lib2to3 sqlite3 xmlrpc distutils setuptools pkg_resources Cython curses idlelib turtle turtledemo ensurepip venv test)
+
+rm -rf temp "dist/$FLAVOR"
 mkdir -p temp
 
 pip install -U -r requirements.txt
@@ -9,39 +24,86 @@ pip install -U -r requirements.txt
 python setup.py build_ext --build-lib=temp --build-temp=temp/build_cython --inplace
 
 mv ./*.so ./temp/
+cp launcher.py temp/
+
+# pyinstaller can't see the imports inside .so files, so list everything the sources import
+HIDDEN_IMPORTS=$(python - "${MODULES[@]}" <<'EOF'
+import ast
+import sys
+
+ours = set(sys.argv[1:]) | {"cython", "cythonshim"}
+found = set()
+for module in sys.argv[1:]:
+    with open(f"{module}.py") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            found.add(node.module)
+print(" ".join(f"--hidden-import={name}" for name in sorted(found) if name.split(".")[0] not in ours))
+EOF
+)
+
+MODULE_ARGS=()
+for module in "${MODULES[@]}"; do
+    MODULE_ARGS+=(--hidden-import="$module" --add-binary "./${module}*.so:.")
+done
+for module in "${EXCLUDED_MODULES[@]}"; do
+    MODULE_ARGS+=(--exclude-module "$module")
+done
 
+# run from temp so pyinstaller finds the compiled modules instead of the .py sources
+cd temp
+# shellcheck disable=SC2086
 python -m PyInstaller \
-    --onefile main.py \
+    "--$FLAVOR" launcher.py \
     -n meow \
-    --distpath=./dist \
-    --workpath=temp/build_pyinstaller \
-    --specpath=temp \
+    --paths=. \
+    --distpath="../dist/$FLAVOR" \
+    --workpath=build_pyinstaller \
+    --specpath=. \
     --clean \
     --upx-dir=/usr/bin \
-    --exclude-module tkinter \
-    --exclude-module unittest \
-    --exclude-module pytest \
     --hidden-import=colorama \
     --hidden-import=tqdm \
-    --hidden-import=helpers \
-    --hidden-import=loaders \
-    --hidden-import=loggers \
-    --add-binary "./helpers*.so:." \
-    --add-binary "./loaders*.so:." \
-    --add-binary "./loggers*.so:." \
+    $HIDDEN_IMPORTS \
+    "${MODULE_ARGS[@]}" \
     --optimize 2
+cd ..
+
+if [ "$FLAVOR" = "onedir" ]; then
+    # the bundled python modules are already precompiled with --optimize 2, strip only native code
+    find dist/onedir/meow -name "*.so*" -exec strip --strip-unneeded {} + 2>/dev/null || true
+    strip --strip-all dist/onedir/meow/meow
+
+    echo -e "\nbundle size: \n$(du -sh dist/onedir/meow)"
+
+    echo -e "\ninstall to /usr/lib/meow and link /usr/bin/meow (ENTER) or exit (anything else)?"
+    read -r CONTINUE < /dev/tty
+    if [ -n "$CONTINUE" ]; then
+        echo "build at dist/onedir/meow"
+        exit 0
+    fi
+
+    sudo rm -rf "/usr/lib/meow"
+    sudo cp -r "./dist/onedir/meow" "/usr/lib/meow"
+    sudo ln -sf "/usr/lib/meow/meow" "/usr/bin/meow"
+    echo "installed to /usr/lib/meow, linked to /usr/bin/meow"
+    exit 0
+fi
 
-strip --strip-all dist/meow
+strip --strip-all dist/onefile/meow
 
-echo -e "\nexecutable size: \n$(du -sh dist/meow)"
+echo -e "\nexecutable size: \n$(du -sh dist/onefile/meow)"
 
 echo -e "\nmove to /usr/bin (ENTER) or exit (anything else)?"
 read -r CONTINUE < /dev/tty
 if [ -n "$CONTINUE" ]; then
-    echo "build at dist/meow"
+    echo "build at dist/onefile/meow"
     exit 0
 fi
 
 
-sudo mv "./dist/meow" "/usr/bin/meow"
-echo "installed to /usr/bin/meow"
\ No newline at end of file
+sudo mv "./dist/onefile/meow" "/usr/bin/meow"
+echo "installed to /usr/bin/meow"
@@ -0,0 +1,92 @@
+from sys import exit
+from time import time
+from hashlib import sha256
+from json import dump, load
+from os import makedirs, remove, replace
+from os.path import dirname
+from typing import Dict, List, Optional, Union
+from subprocess import run as runsubprocess, CompletedProcess
+from loggers import error
+from reports import StepReport, succeeded
+from helpers import getgitoutput, getgitpath
+
+'''
+per-repo record of the finished steps of a run, for --resume
+'''
+
+CHECKPOINTFILE: str = "meow/checkpoint.json"
+
+def getrepostate() -> Dict[str, Optional[str]]:
+    '''
+    HEAD and a hash of the staged entries, which is all the steps after a failure depend on.
+    ls-files only reads the index, so unlike write-tree it never takes or waits for index.lock
+    '''
+    entries: CompletedProcess[bytes] = runsubprocess(["git", "ls-files", "--stage", "-z"], check=False, capture_output=True)
+    return {
+        "head": getgitoutput(["git", "rev-parse", "--verify", "-q", "HEAD"]),
+        "index": sha256(entries.stdout).hexdigest() if entries.returncode == 0 else None,
+    }
+
+class Checkpoint:
+    '''the arguments of a run, its finished steps, and the repo state after the last one'''
+    def __init__(self, argv: List[str], completed: Optional[List[Dict[str, Union[str, float]]]] = None):
+        self.argv = argv
+        self.completed: List[Dict[str, Union[str, float]]] = completed if completed is not None else []
+        self.state: Dict[str, Optional[str]] = {}
+
+    @property
+    def completedsteps(self) -> List[str]:
+        '''names of the steps that don't need to run again'''
+        return [str(step["step"]) for step in self.completed]
+
+    def record(self, report: StepReport, readstate: bool = True) -> None:
+        '''
+        saves a step that succeeded. failed steps aren't recorded, so --resume runs them again.
+        without readstate the state after the previous step is kept, for steps that run while another
+        meow run may be changing the repo and that don't change HEAD or the index themselves, like a --coordinate push
+        '''
+        if not succeeded(report):
+            return
+        self.completed.append({"step": report.step, "duration": report.duration})
+        if readstate or not self.state:
+            self.state = getrepostate()
+        self.save()
+
+    def save(self) -> None:
+        '''writes the checkpoint, replacing the previous one in one rename'''
+        path: Optional[str] = getgitpath(CHECKPOINTFILE)
+        if path is None:
+            return
+        makedirs(dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            dump({"argv": self.argv, "completed": self.completed, "saved": time(), **self.state}, f)
+        replace(f"{path}.tmp", path)
+
+    def clear(self) -> None:
+        '''forgets the run once every step succeeded'''
+        path: Optional[str] = getgitpath(CHECKPOINTFILE)
+        try:
+            if path is not None:
+                remove(path)
+        except FileNotFoundError:
+            pass
+
+def loadcheckpoint() -> Checkpoint:
+    '''
+    the checkpoint of the last unfinished run. exits if there is none,
+    or if HEAD or the index changed since its last finished step
+    '''
+    path: Optional[str] = getgitpath(CHECKPOINTFILE)
+    try:
+        with open(path or "") as f:
+            saved: dict = load(f)
+    except (OSError, ValueError):
+        error("error: nothing to resume, the last meow run in this repo finished or never started")
+        exit(1)
+
+    checkpoint: Checkpoint = Checkpoint(saved["argv"], saved["completed"])
+    checkpoint.state = {"head": saved.get("head"), "index": saved.get("index")}
+    if checkpoint.state != getrepostate():
+        error("error: HEAD or the staged changes changed since the interrupted run, run meow again without --resume")
+        exit(1)
+    return checkpoint
@@ -0,0 +1,269 @@
+from sys import exit
+from time import time
+from tqdm import tqdm
+from shlex import quote
+from shutil import rmtree
+from hashlib import sha256
+from fnmatch import fnmatch
+from tempfile import mkdtemp
+from json import dump, load
+from colorama import Fore, Style
+from argparse import Namespace
+from os import makedirs, replace
+from os.path import dirname, join
+from typing import Dict, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from subprocess import list2cmdline, run as runsubprocess, CompletedProcess
+from loggers import error, info, success, printcmd
+from helpers import MinimalNamespace, getgitpath, getjobs, failstep
+
+'''
+cached, parallel checks on staged files for --check
+'''
+
+CACHEFILE: str = "meow/checkcache.json"
+MAXCACHEENTRIES: int = 100000
+MAXCHUNK: int = 64 # files per check command, so a failing chunk is cheap to narrow down
+
+class Check:
+    '''
+    a check configured in git config:
+        [meowcheck "NAME"]
+            command = flake8     # run with the staged files as arguments, passes on exit code 0
+            pattern = *.py       # which files it applies to, can be given more than once (default: all)
+            maxsize = 1m         # fail files larger than this, instead of or on top of command
+    '''
+    def __init__(self, name: str):
+        self.name = name
+        self.command: Optional[str] = None
+        self.patterns: List[str] = []
+        self.maxsize: Optional[int] = None
+
+    def matches(self, path: str) -> bool:
+        '''whether the check applies to path'''
+        return not self.patterns or any(fnmatch(path, pattern) for pattern in self.patterns)
+
+    def cachekey(self, blob: str) -> str:
+        '''results are only reused for the same content and the same check configuration'''
+        config: str = "\0".join([self.command or "", str(self.maxsize), *self.patterns])
+        return f"{sha256(config.encode()).hexdigest()[:12]}:{blob}"
+
+def parsesize(value: str) -> int:
+    '''a git config size like 512, 100k or 50m in bytes'''
+    units: Dict[str, int] = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    value = value.strip().lower()
+    for suffix, multiplier in units.items():
+        if value.endswith(suffix):
+            return int(value[:len(value) - 1]) * multiplier
+    return int(value)
+
+def getchecks() -> List[Check]:
+    '''checks configured under meowcheck.NAME.*'''
+    result: CompletedProcess[bytes] = runsubprocess(["git", "config", "-z", "--get-regexp", r"^meowcheck\."], check=False, capture_output=True)
+    checks: Dict[str, Check] = {}
+    for entry in result.stdout.decode('utf-8', errors='replace').split('\0'):
+        if not entry:
+            continue
+        key, _, value = entry.partition('\n')
+        name, _, setting = key[len("meowcheck."):].rpartition('.')
+        if not name:
+            continue
+        check: Check = checks.setdefault(name, Check(name))
+        if setting == "command":
+            check.command = value
+        elif setting == "pattern":
+            check.patterns.append(value)
+        elif setting == "maxsize":
+            try:
+                check.maxsize = parsesize(value)
+            except ValueError:
+                error(f"invalid meowcheck.{name}.maxsize: {value}")
+                exit(1)
+    return [check for check in checks.values() if check.command or check.maxsize is not None]
+
+def getstagedblobs(cmd: List[str]) -> Dict[str, str]:
+    '''path -> staged blob sha for every added or modified file, from `git diff --cached --raw -z`'''
+    result: CompletedProcess[bytes] = runsubprocess(cmd, check=False, capture_output=True)
+    fields: List[str] = result.stdout.decode('utf-8', errors='replace').split('\0')
+    blobs: Dict[str, str] = {}
+    # each entry is ":oldmode newmode oldsha newsha status" followed by the path
+    for header, path in zip(fields[0::2], fields[1::2]):
+        parts: List[str] = header.split()
+        # skip gitlinks, a submodule isn't a file to check
+        if len(parts) == 5 and parts[1] != "160000":
+            blobs[path] = parts[3]
+    return blobs
+
+def getblobsizes(blobs: List[str]) -> Dict[str, int]:
+    '''blob sha -> size in bytes, in one `git cat-file --batch-check`'''
+    result: CompletedProcess[bytes] = runsubprocess(
+        ["git", "cat-file", "--batch-check=%(objectname) %(objectsize)"],
+        input="\n".join(blobs).encode(), check=False, capture_output=True
+    )
+    sizes: Dict[str, int] = {}
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        parts: List[str] = line.split()
+        if len(parts) == 2 and parts[1].isdigit():
+            sizes[parts[0]] = int(parts[1])
+    return sizes
+
+def exportstaged(paths: List[str], toplevel: str) -> Tuple[Dict[str, str], Optional[str]]:
+    '''
+    path -> file to check, and the temp dir to remove afterwards. files whose staged content differs
+    from the work tree are written out of the index into the temp dir, so checks see what will be committed
+    '''
+    result: CompletedProcess[bytes] = runsubprocess(["git", "diff", "--name-only", "-z"], check=False, capture_output=True, cwd=toplevel)
+    unstaged: Set[str] = set(result.stdout.decode('utf-8', errors='replace').split('\0')) & set(paths)
+    locations: Dict[str, str] = {path: path for path in paths}
+    directory: Optional[str] = None
+    if unstaged:
+        directory = mkdtemp(prefix="meow-check-")
+        runsubprocess(
+            ["git", "checkout-index", f"--prefix={directory}/", "-z", "--stdin"],
+            input="\0".join(sorted(unstaged)).encode(), check=False, capture_output=True, cwd=toplevel
+        )
+        locations.update({path: join(directory, path) for path in unstaged})
+    return locations, directory
+
+def loadcache(path: str) -> Dict[str, float]:
+    '''cache key -> last time it passed'''
+    try:
+        with open(path) as f:
+            return load(f)
+    except (OSError, ValueError):
+        return {}
+
+def savecache(path: str, cache: Dict[str, float]) -> None:
+    '''writes the cache, dropping the least recently used entries past MAXCACHEENTRIES'''
+    if len(cache) > MAXCACHEENTRIES:
+        cache = dict(sorted(cache.items(), key=lambda item: item[1])[len(cache) - MAXCACHEENTRIES:])
+    makedirs(dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        dump(cache, f)
+    replace(f"{path}.tmp", path)
+
+def runcheck(check: Check, paths: List[str], locations: Dict[str, str], toplevel: str) -> Tuple[List[str], List[CompletedProcess[bytes]]]:
+    '''
+    runs check.command on a chunk of files. returns the files that passed, and the failing runs.
+    a failing chunk is re-run file by file to find which files failed
+    '''
+    def _run(chunk: List[str]) -> CompletedProcess[bytes]:
+        return runsubprocess(
+            f"{check.command} {' '.join(quote(locations[path]) for path in chunk)}",
+            shell=True, check=False, capture_output=True, cwd=toplevel
+        )
+
+    result: CompletedProcess[bytes] = _run(paths)
+    if result.returncode == 0:
+        return paths, []
+    if len(paths) == 1:
+        return [], [result]
+
+    passed: List[str] = []
+    failures: List[CompletedProcess[bytes]] = []
+    for path in paths:
+        single: CompletedProcess[bytes] = _run([path])
+        if single.returncode == 0:
+            passed.append(path)
+        else:
+            failures.append(single)
+    return passed, failures
+
+def checkscommand(
+        args: Namespace,
+        pbar: Optional[tqdm]
+        ) -> Tuple[int, List[str]]:
+    '''gets command listing the staged files to check'''
+    if args.check:
+        info("\nchecking staged files", pbar)
+        if pbar:
+            pbar.update(1)
+        return 1, ["git", "diff", "--cached", "--raw", "-z", "--no-abbrev", "--no-renames", "--diff-filter=AM"]
+    return 0, []
+
+def runchecks(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = True
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''
+    runs every configured check on the staged files that match it, skipping files whose staged blob
+    already passed the same check. chunks of files run concurrently on --jobs threads
+    '''
+    if not cmd:
+        return None
+    if flags.dry:
+        printcmd(list2cmdline(cmd), pbar)
+        return None
+
+    start: float = time()
+    checks: List[Check] = getchecks()
+    cachepath: Optional[str] = getgitpath(CACHEFILE)
+    toplevel: str = runsubprocess(["git", "rev-parse", "--show-toplevel"], check=False, capture_output=True).stdout.decode('utf-8', errors='replace').strip()
+    if not checks or cachepath is None or not toplevel:
+        info(f"    {Fore.CYAN}no checks configured (see `git config meowcheck.NAME.command`)", pbar)
+        return CompletedProcess(args=cmd, returncode=0, stdout=b"no checks configured", stderr=b"")
+
+    blobs: Dict[str, str] = getstagedblobs(cmd)
+    cache: Dict[str, float] = loadcache(cachepath)
+    sizes: Dict[str, int] = getblobsizes(sorted(set(blobs.values()))) if any(check.maxsize is not None for check in checks) else {}
+
+    lines: List[str] = []
+    failures: List[Tuple[str, str, bytes]] = [] # (check, command, output)
+    total: int = 0
+    hits: int = 0
+    pending: Dict[str, List[str]] = {} # check name -> files to run its command on
+
+    for check in checks:
+        matching: List[str] = [path for path in blobs if check.matches(path)]
+        total += len(matching)
+        uncached: List[str] = [path for path in matching if check.cachekey(blobs[path]) not in cache]
+        hits += len(matching) - len(uncached)
+
+        passed: List[str] = []
+        for path in uncached:
+            if check.maxsize is not None and sizes.get(blobs[path], 0) > check.maxsize:
+                failures.append((check.name, f"maxsize {check.maxsize}", f"{path} is {sizes[blobs[path]]} bytes".encode()))
+            elif check.command:
+                pending.setdefault(check.name, []).append(path)
+            else:
+                passed.append(path)
+        for path in passed:
+            cache[check.cachekey(blobs[path])] = time()
+        lines.append(f"{check.name}: {len(matching)} files, {len(matching) - len(uncached)} cached")
+
+    if pending:
+        bychecks: Dict[str, Check] = {check.name: check for check in checks}
+        locations, exported = exportstaged(sorted({path for paths in pending.values() for path in paths}), toplevel)
+        jobs: int = getjobs(flags)
+        chunks: List[Tuple[Check, List[str]]] = []
+        for name, paths in pending.items():
+            size: int = max(1, min(MAXCHUNK, -(-len(paths) // jobs)))
+            chunks.extend((bychecks[name], paths[i:i + size]) for i in range(0, len(paths), size))
+
+        info(f"    running {len(chunks)} checks ({min(jobs, len(chunks))} at a time):", pbar)
+        # each check is its own process, so threads waiting on them are enough to use every core
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(runcheck, check, paths, locations, toplevel): check for check, paths in chunks}
+            for future in as_completed(futures):
+                finished: Check = futures[future]
+                passed, failed = future.result()
+                for path in passed:
+                    cache[finished.cachekey(blobs[path])] = time()
+                for result in failed:
+                    failures.append((finished.name, str(result.args), result.stdout + result.stderr))
+        if exported:
+            rmtree(exported, ignore_errors=True)
+
+    savecache(cachepath, cache)
+    duration: float = time() - start
+    lines.append(f"cache hit rate: {hits}/{total} ({hits / total * 100 if total else 0:.0f}%) in {duration:.2f} seconds")
+    summary: bytes = "\n".join(lines).encode("utf-8")
+
+    if failures:
+        failstep(1, flags, pbar, [(1, f"{name}: {command}", output, None) for name, command, output in failures])
+        return CompletedProcess(args=cmd, returncode=1, stdout=summary, stderr=b"")
+
+    success(f"    ✓ {total} checks passed, {hits} cached {Style.DIM}({duration:.2f}s)", pbar)
+    return CompletedProcess(args=cmd, returncode=0, stdout=summary, stderr=b"")
@@ -0,0 +1,268 @@
+from sys import exit
+from time import time
+from tqdm import tqdm
+from shutil import rmtree
+from hashlib import sha256
+from colorama import Fore
+from argparse import Namespace
+from os import cpu_count, listdir, walk, environ, makedirs, utime
+from typing import List, Tuple, Optional, Set, Dict, Final
+from os.path import isdir, join, getsize, getmtime, islink, expanduser
+from subprocess import run as runsubprocess, CompletedProcess
+from loggers import error, info, warning
+from helpers import MinimalNamespace, lockfile
+from network import runnetworkcmd, parsenetworkargs
+
+'''
+handles meow clone
+'''
+
+CLONEFILTERS: Final[Dict[str, str]] = {
+    "blobless": "blob:none",
+    "treeless": "tree:0"
+}
+
+HUGEREPOKB: Final[int] = 2 * 1024 * 1024 # repos bigger than this (2 GiB) default to a treeless --fast clone
+
+DEFAULTCACHEBUDGETMB: Final[int] = 10 * 1024
+
+class CloneProfile:
+    '''meow-specific options for git clone'''
+    def __init__(
+            self,
+            fast: Optional[str] = None,
+            depth: Optional[int] = None,
+            jobs: Optional[int] = None,
+            cache: bool = False,
+            cachebudget: int = DEFAULTCACHEBUDGETMB
+            ):
+        self.fast = fast # "auto", "blobless" or "treeless"
+        self.depth = depth
+        self.jobs = jobs
+        self.cache = cache
+        self.cachebudget = cachebudget # MiB
+
+def _getintvalue(flag: str, value: Optional[str]) -> int:
+    '''private function to parse the value of a numeric clone flag'''
+    if value is None or not value.isdigit() or int(value) < 1:
+        error(f"error: {flag} needs a positive number")
+        exit(1)
+    return int(value)
+
+def parsecloneargs(commandarguments: List[str]) -> Tuple[CloneProfile, List[str]]:
+    '''splits meow clone flags (--fast, --shallow, --jobs, --cache, --cache-budget) from the arguments passed to git'''
+    profile: CloneProfile = CloneProfile()
+    gitargs: List[str] = []
+
+    i: int = 0
+    while i < len(commandarguments):
+        arg: str = commandarguments[i]
+        flag, _, value = arg.partition('=')
+        if flag == "--fast":
+            mode: str = value or "auto"
+            if mode != "auto" and mode not in CLONEFILTERS:
+                error(f"error: --fast must be one of: {', '.join(CLONEFILTERS)}")
+                exit(1)
+            profile.fast = mode
+        elif arg == "--cache":
+            profile.cache = True
+        elif flag in ("--shallow", "--jobs", "-j", "--cache-budget"):
+            if not value:
+                i += 1
+                value = commandarguments[i] if i < len(commandarguments) else ""
+            if flag == "--shallow":
+                profile.depth = _getintvalue(flag, value)
+            elif flag == "--cache-budget":
+                profile.cache = True
+                profile.cachebudget = _getintvalue(flag, value)
+            else:
+                profile.jobs = _getintvalue(flag, value)
+        else:
+            gitargs.append(arg)
+        i += 1
+
+    return profile, gitargs
+
+def getremoteurl(gitargs: List[str]) -> Optional[str]:
+    '''finds the repository being cloned in the arguments passed to git'''
+    for arg in gitargs:
+        if arg.startswith('-'):
+            continue
+        if "://" in arg or ':' in arg or isdir(arg):
+            return arg
+    return None
+
+def getlocalpath(url: str) -> Optional[str]:
+    '''returns the path of a repository on this machine, or None for network remotes'''
+    if url.startswith("file://"):
+        return url[len("file://"):]
+    if "://" not in url and isdir(url):
+        return url
+    return None
+
+def estimaterepositorysize(url: Optional[str]) -> Optional[int]:
+    '''size of the objects in a repository in KiB, if it can be measured without a network round trip'''
+    path: Optional[str] = getlocalpath(url) if url else None
+    if path is None:
+        return None
+
+    result: CompletedProcess[bytes] = runsubprocess(
+        ["git", "-C", path, "count-objects", "-v"], check=False, capture_output=True
+    )
+    if result.returncode != 0:
+        return None
+
+    size: int = 0
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        key, _, value = line.partition(': ')
+        if key in ("size", "size-pack") and value.isdigit():
+            size += int(value)
+    return size
+
+def getclonecommand(profile: CloneProfile, gitargs: List[str], mirror: Optional[str] = None) -> List[str]:
+    '''
+    gets the git clone command for a meow clone profile.
+    note that git ignores --filter and --depth for plain local paths, use a file:// url instead
+    '''
+    cmd: List[str] = ["git", "clone"] + gitargs + ["--verbose", "--recursive", "--remote-submodules"]
+    cmd.extend(["--jobs", str(profile.jobs or cpu_count() or 1)])
+
+    if profile.fast:
+        mode: str = profile.fast
+        if mode == "auto":
+            size: Optional[int] = estimaterepositorysize(getremoteurl(gitargs))
+            mode = "treeless" if size is not None and size >= HUGEREPOKB else "blobless"
+        cmd.extend([f"--filter={CLONEFILTERS[mode]}", "--also-filter-submodules"])
+
+    if profile.depth:
+        cmd.extend(["--depth", str(profile.depth), "--shallow-submodules"])
+
+    if mirror:
+        # --dissociate copies the borrowed objects, so evicting the mirror later can't break the clone
+        cmd.extend(["--reference-if-able", mirror, "--dissociate"])
+
+    return cmd
+
+def getcachedirectory() -> str:
+    '''directory holding the bare mirrors used as clone references'''
+    if environ.get("MEOW_CACHE_DIR"):
+        return environ["MEOW_CACHE_DIR"]
+    cachehome: str = environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+    return join(cachehome, "meow", "mirrors")
+
+def getmirrorpath(url: str) -> str:
+    '''path of the bare mirror for a remote url'''
+    key: str = sha256(url.rstrip('/').encode('utf-8')).hexdigest()[:16]
+    return join(getcachedirectory(), f"{key}.git")
+
+def updatemirror(url: str, mirror: str, networkflags: Namespace = MinimalNamespace, pbar: Optional[tqdm] = None) -> bool:
+    '''creates or incrementally fetches the mirror of url. returns whether the mirror is usable'''
+    makedirs(getcachedirectory(), exist_ok=True)
+    flags: Namespace = Namespace(**{**vars(networkflags), "cont": True, "verbose": False, "message": ""})
+
+    with lockfile(f"{mirror}.lock"):
+        if isdir(mirror):
+            info(f"    i {Fore.CYAN}updating cached mirror", pbar)
+            result = runnetworkcmd(cmd=["git", "-C", mirror, "fetch", "--prune", "--quiet"], flags=flags, pbar=pbar, withprogress=False)
+        else:
+            info(f"    i {Fore.CYAN}creating cached mirror", pbar)
+            result = runnetworkcmd(cmd=["git", "clone", "--mirror", "--quiet", url, mirror], flags=flags, pbar=pbar, withprogress=False)
+        if result is None or result.returncode != 0:
+            warning("    ! mirror update failed, cloning without the cache", pbar)
+            return False
+        utime(mirror) # mtime is the last-used time for eviction
+    return True
+
+def evictmirrors(budget: int, keep: str, pbar: Optional[tqdm] = None) -> None:
+    '''
+    removes least recently used mirrors until the cache fits in budget (MiB).
+    mirrors that another meow is updating or evicting are left out, since their files come and go
+    '''
+    cachedir: str = getcachedirectory()
+    try:
+        mirrors: List[str] = [join(cachedir, name) for name in listdir(cachedir) if name.endswith(".git")]
+    except OSError:
+        return
+
+    # (last used, size) of every mirror, measured under a shared lock so no update or eviction runs meanwhile
+    usage: Dict[str, Tuple[float, int]] = {}
+    for mirror in mirrors:
+        with lockfile(f"{mirror}.lock", exclusive=False, blocking=False) as locked:
+            if not locked:
+                continue
+            try:
+                usage[mirror] = (getmtime(mirror), getdirectorysize(mirror))
+            except OSError:
+                continue # evicted since listdir
+    total: int = sum(size for _, size in usage.values())
+
+    for mirror in sorted(usage, key=lambda mirror: usage[mirror][0]):
+        if total <= budget * 1024 * 1024:
+            break
+        if mirror == keep:
+            continue
+        # skip mirrors that another meow is updating or cloning from
+        with lockfile(f"{mirror}.lock", blocking=False) as locked:
+            if not locked or not isdir(mirror):
+                continue
+            info(f"    i {Fore.CYAN}evicting cached mirror {mirror} ({formatsize(usage[mirror][1])})", pbar)
+            rmtree(mirror, ignore_errors=True)
+            total -= usage[mirror][1]
+
+def getdirectorysize(path: str) -> int:
+    '''total size in bytes of the files under path, skipping files removed while it walks'''
+    total: int = 0
+    for root, _, files in walk(path):
+        for name in files:
+            filepath: str = join(root, name)
+            try:
+                if not islink(filepath):
+                    total += getsize(filepath)
+            except OSError:
+                continue
+    return total
+
+def formatsize(size: float) -> str:
+    '''formats a byte count for humans'''
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+def showclonethroughput(before: Set[str], duration: float, pbar: Optional[tqdm] = None) -> None:
+    '''prints how much was cloned and how fast, based on the directories that appeared in cwd'''
+    created: List[str] = [name for name in listdir() if name not in before and isdir(join(name, ".git"))]
+    if not created or duration <= 0:
+        return
+
+    size: int = sum(getdirectorysize(join(name, ".git")) for name in created)
+    info(f"    i {Fore.CYAN}cloned {formatsize(size)} in {duration:.2f}s ({formatsize(size / duration)}/s)", pbar)
+
+def runclone(commandarguments: List[str], flags: Optional[Namespace] = None, pbar: Optional[tqdm] = None) -> Optional[CompletedProcess[bytes]]:
+    '''runs meow clone and reports its throughput. flags holds --timeout, --retries and --hedge'''
+    if flags is None:
+        flags, commandarguments = parsenetworkargs(commandarguments)
+    profile: CloneProfile
+    gitargs: List[str]
+    profile, gitargs = parsecloneargs(commandarguments)
+    before: Set[str] = set(listdir())
+
+    url: Optional[str] = getremoteurl(gitargs)
+    mirror: Optional[str] = getmirrorpath(url) if profile.cache and url else None
+    if profile.cache and not url:
+        warning("    ! couldn't find the url to clone, cloning without the cache", pbar)
+
+    start: float = time()
+    if mirror and url and updatemirror(url, mirror, flags, pbar):
+        # a shared lock keeps the mirror from being evicted while we clone from it
+        with lockfile(f"{mirror}.lock", exclusive=False):
+            result: Optional[CompletedProcess[bytes]] = runnetworkcmd(cmd=getclonecommand(profile, gitargs, mirror), flags=flags, pbar=pbar)
+        evictmirrors(profile.cachebudget, keep=mirror, pbar=pbar)
+    else:
+        result = runnetworkcmd(cmd=getclonecommand(profile, gitargs), flags=flags, pbar=pbar)
+    duration: float = time() - start
+
+    if result and result.returncode == 0:
+        showclonethroughput(before, duration, pbar)
+    return result
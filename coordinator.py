@@ -0,0 +1,77 @@
+from tqdm import tqdm
+from colorama import Fore
+from argparse import Namespace
+from typing import List, Optional, Tuple
+from subprocess import run as runsubprocess, CompletedProcess
+from loggers import info, success
+from helpers import MinimalNamespace, FileLock, getgitoutput, getgitpath
+from network import runnetworkcmd
+from prefetch import getupstream
+
+'''
+per-repo coordination of concurrent meow runs for --coordinate
+'''
+
+PIPELINELOCK: str = "meow/pipeline.lock"
+PUSHLOCK: str = "meow/push.lock"
+
+def waitfor(lock: FileLock, waitmessage: str, pbar: Optional[tqdm] = None) -> None:
+    '''takes lock, saying so when it has to wait for whoever holds it'''
+    if not lock.acquire(blocking=False):
+        info(f"    i {Fore.CYAN}{waitmessage}", pbar)
+        lock.acquire()
+
+class Coordinator:
+    '''
+    queues meow runs on one repo instead of letting them collide on index.lock.
+    the pipeline lock is held from the first step until the push starts, the push lock only around pushes
+    '''
+    def __init__(self):
+        self.pipelinelock: FileLock = FileLock(getgitpath(PIPELINELOCK) or PIPELINELOCK)
+        self.pushlock: FileLock = FileLock(getgitpath(PUSHLOCK) or PUSHLOCK)
+
+    def start(self, pbar: Optional[tqdm] = None) -> None:
+        '''waits for the runs ahead of this one'''
+        waitfor(self.pipelinelock, "waiting for another meow run in this repo", pbar)
+
+    def finish(self) -> None:
+        '''releases whatever this run still holds'''
+        self.pipelinelock.release()
+        self.pushlock.release()
+
+def isonremote(sha: str, trackingref: str) -> bool:
+    '''whether sha is already contained in what was last pushed to or fetched from the upstream'''
+    return runsubprocess(["git", "merge-base", "--is-ancestor", sha, trackingref], check=False, capture_output=True).returncode == 0
+
+def runcoalescedpush(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = True
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''
+    pushes on behalf of every run queued behind this one. the pipeline lock is handed to the next run
+    before pushing, so commits made while this push waits go out with the next push, and a run whose
+    commit was already pushed by someone else skips its push
+    '''
+    coordinator: Optional[Coordinator] = getattr(flags, "coordinator", None)
+    if not cmd or flags.dry or coordinator is None:
+        return runnetworkcmd(cmd=cmd, flags=flags, pbar=pbar, withprogress=withprogress)
+
+    sha: Optional[str] = getgitoutput(["git", "rev-parse", "--verify", "-q", "HEAD"])
+    upstream: Optional[Tuple[str, str, str]] = getupstream()
+
+    coordinator.pipelinelock.release()
+    waitfor(coordinator.pushlock, "waiting for another meow push in this repo", pbar)
+    try:
+        if sha and upstream and isonremote(sha, upstream[2]):
+            message: str = f"{sha[:7]} is already on {upstream[2]}, pushed by another meow run"
+            success(f"    ✓ {message}", pbar)
+            return CompletedProcess(args=cmd, returncode=0, stdout=message.encode(), stderr=b"")
+
+        result: Optional[CompletedProcess[bytes]] = runnetworkcmd(cmd=cmd, flags=flags, pbar=pbar, withprogress=withprogress)
+        if result is not None and result.returncode == 0 and sha and upstream and isonremote(sha, upstream[2]):
+            info(f"    i {Fore.CYAN}{sha[:7]} is on {upstream[2]}", pbar)
+        return result
+    finally:
+        coordinator.pushlock.release()
@@ -0,0 +1,35 @@
+from typing import Any, Callable, TypeVar
+
+'''
+stand-in for the `cython` module when Cython isn't installed.
+compiled modules never import it: cython's pure-python syntax is resolved at compile time.
+everything here is a no-op so the interpreted modules behave exactly like the compiled ones
+'''
+
+T = TypeVar("T")
+
+compiled: bool = False
+
+# c types used in annotations map to the python types they behave like
+int = int
+long = int
+Py_ssize_t = int
+double = float
+bint = bool
+
+def _identity(obj: T) -> T:
+    return obj
+
+cclass = _identity
+ccall = _identity
+cfunc = _identity
+inline = _identity
+final = _identity
+
+def locals(**types: Any) -> Callable[[T], T]:
+    '''@cython.locals(...) only declares types'''
+    return _identity
+
+def declare(*args: Any, **kwargs: Any) -> None:
+    '''cython.declare(...) only declares a type, attributes get their value in __init__'''
+    return None
@@ -0,0 +1,22 @@
+from typing import List, Optional
+
+'''
+exceptions raised instead of exiting, so the api can report them
+'''
+
+class MeowError(Exception):
+    '''base class of everything meow raises on purpose'''
+
+class InvalidArguments(MeowError):
+    '''an option or a combination of options that can't work'''
+
+class CommandFailed(MeowError):
+    '''a step's command exited with a nonzero code'''
+    def __init__(self, step: str, cmd: List[str], returncode: int, stdout: bytes = b"", stderr: bytes = b"", results: Optional[list] = None):
+        super().__init__(f"{step} failed with exit code {returncode}: {' '.join(cmd)}")
+        self.step = step
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.results = results if results is not None else [] # results of every command that ran, this one last
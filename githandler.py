@@ -2,7 +2,10 @@ from sys import exit
 from tqdm import tqdm
 from colorama import Fore, Style
 from typing import List, Optional, Dict
+from argparse import Namespace
 from helpers import getgitcommands, runcmd
+from clone import runclone
+from network import runnetworkcmd, parsenetworkargs
 from loggers import error, info, printcmd, showcommitresult
 from loaders import startloadinganimation, stoploadinganimation, ThreadEventTuple
 from subprocess import list2cmdline, run as runsubprocess, CalledProcessError, CompletedProcess
@@ -11,6 +14,8 @@ from subprocess import list2cmdline, run as runsubprocess, CalledProcessError, C
 handles meow <cmd>
 '''
 
+NETWORKCMDS: List[str] = ["push", "pull", "fetch"]
+
 def handlegitcommands(args: List[str], messages: Dict[str, str]) -> None:
     '''handles meow <cmd> commands'''
     result: Optional[CompletedProcess[bytes]]
@@ -27,6 +32,11 @@ def handlegitcommands(args: List[str], messages: Dict[str, str]) -> None:
         returncode = result.returncode if result else 0
         exit(returncode)
     
+    # --timeout, --retries and --hedge are meow's, the rest goes to git
+    flags: Optional[Namespace] = None
+    if gitcommand == "clone" or gitcommand in NETWORKCMDS:
+        flags, commandarguments = parsenetworkargs(commandarguments)
+
     lastcmdstr = ""
     try:
         with tqdm(
@@ -42,15 +52,21 @@ def handlegitcommands(args: List[str], messages: Dict[str, str]) -> None:
             if not (gitcommand == "commit" and not commandarguments):
                 animation = startloadinganimation(getloadingmessage(gitcommand, messages))
             
-            precmd, cmd = getgitcommands(gitcommand, commandarguments)
-            lastcmdstr = list2cmdline(cmd)
-            
-            # (optional) pre-command
-            runcmd(cmd=precmd, pbar=mainpbar)
-            info(message="", pbar=mainpbar)
-            
-            # maincommand
-            result = runcmd(cmd=cmd, pbar=mainpbar)
+            if gitcommand == "clone":
+                result = runclone(commandarguments, flags=flags, pbar=mainpbar)
+            else:
+                precmd, cmd = getgitcommands(gitcommand, commandarguments)
+                lastcmdstr = list2cmdline(cmd)
+
+                # (optional) pre-command
+                runcmd(cmd=precmd, pbar=mainpbar)
+                info(message="", pbar=mainpbar)
+
+                # maincommand
+                if flags is not None:
+                    result = runnetworkcmd(cmd=cmd, flags=flags, pbar=mainpbar)
+                else:
+                    result = runcmd(cmd=cmd, pbar=mainpbar)
             
             if animation:
                 stoploadinganimation(animation)
@@ -1,12 +1,16 @@
 from sys import exit
 from time import time
-from os import getcwd
+from fcntl import flock, LOCK_EX, LOCK_SH, LOCK_NB, LOCK_UN
+from os import getcwd, cpu_count, makedirs, open as osopen, close, O_CREAT, O_RDWR
+from os.path import abspath, dirname
 from tqdm import tqdm
 from colorama import Style, Fore
 from contextlib import contextmanager
-from typing import List, Tuple, Optional, Dict
+from collections.abc import Callable
+from typing import List, Tuple, Optional, Dict, Set, Iterator
 from argparse import ArgumentParser, _ArgumentGroup, Namespace
 from loggers import error, info, success, printcmd, printoutput
+from errors import InvalidArguments
 from loaders import startloadinganimation, stoploadinganimation
 from subprocess import list2cmdline, run as runsubprocess, CompletedProcess, CalledProcessError
 
@@ -14,6 +18,8 @@ from subprocess import list2cmdline, run as runsubprocess, CompletedProcess, Cal
 helpers
 '''
 
+FailureType = Tuple[int, str, Optional[bytes], Optional[bytes]] # returncode, command, stdout, stderr
+
 MinimalNamespace = Namespace(
     cont=False, 
     dry=False, 
@@ -42,10 +48,16 @@ def completebar(pbar: tqdm, totalsteps: int) -> None:
     pbar.refresh()
 
 def validateargs(args: Namespace) -> None:
-    '''validate argument combinations'''
+    '''validate argument combinations, raises InvalidArguments'''
     if not args.amend and not args.nomsg and not args.message:
-        error("error: commit message required (use --amend, --no-message, or provide message)")
-        exit(1)
+        raise InvalidArguments("commit message required (use --amend, --no-message, or provide message)")
+    if args.pushto and args.upstream:
+        raise InvalidArguments("--push-to can't be combined with --set-upstream")
+    if args.pushto is not None and not getpushremotes(args):
+        raise InvalidArguments("--push-to needs at least one remote (format: REMOTE,REMOTE,...)")
+    if args.upstream:
+        # checked before anything runs, so a bad upstream can't fail the push after the commit
+        splitupstream(args.upstream)
 
 def initcommands(parser: ArgumentParser) -> None:
     '''initialize commands with commands.'''
@@ -61,6 +73,7 @@ def initcommands(parser: ArgumentParser) -> None:
     generalgrp.add_argument("-ve", "--verbose", action='store_true', help="verbose output")
     generalgrp.add_argument("--dry", dest = "dry", action='store_true', help="preview commands without execution")
     generalgrp.add_argument("--status", action='store_true', help="show git status before executing commands")
+    generalgrp.add_argument("--resume", action='store_true', help="rerun the last unfinished run in this repo, skipping the steps it finished")
 
     # commit options
     commitgrp: _ArgumentGroup = parser.add_argument_group("commit options")
@@ -68,6 +81,7 @@ def initcommands(parser: ArgumentParser) -> None:
     commitgrp.add_argument("--allow-empty", dest="allowempty", action='store_true', help="allow empty commit")
     commitgrp.add_argument("--diff", action='store_true', help="show diff before committing")
     commitgrp.add_argument("--amend", action='store_true', help="amend previous commit")
+    commitgrp.add_argument("--check", action='store_true', help="run the checks configured as meowcheck.NAME.command on staged files before committing")
 
     # push options
     pushgrp: _ArgumentGroup = parser.add_argument_group("push options")
@@ -75,36 +89,53 @@ def initcommands(parser: ArgumentParser) -> None:
     pushgrp.add_argument("-f", "--force", action='store_true', help="force push")
     pushgrp.add_argument("-np", "--no-push", dest="nopush", action='store_true', help="skip pushing")
     pushgrp.add_argument("--tags", action='store_true', help="push tags with commits")
+    pushgrp.add_argument("--push-to", dest="pushto", metavar="REMOTE,REMOTE,...", help="push the current branch to several remotes at once")
+    pushgrp.add_argument("--preflight", action='store_true', help="check the objects about to be pushed for oversized files before pushing")
+    pushgrp.add_argument("--max-blob-size", dest="maxblobsize", type=float, default=50, metavar="MB", help="largest file --preflight lets through (default: 50)")
+    pushgrp.add_argument("--scan-secrets", dest="scansecrets", action='store_true', help="also scan the new files for secrets with --preflight")
 
     # pull options
     pullgrp: _ArgumentGroup = parser.add_argument_group("pull options")
     pullgrp.add_argument("--pull", action='store_true', help="run git pull before pushing")
     pullgrp.add_argument("--pull-no-rebase", dest="norebase", action='store_true', help="run git pull --no-rebase (overrides --pull)")
+    pullgrp.add_argument("--prefetch", action='store_true', help="fetch in the background after each run, so the next pull can merge locally")
+    pullgrp.add_argument("--prefetch-interval", dest="prefetchinterval", type=int, default=300, metavar="SECONDS", help="minimum time between background fetches of a repo (default: 300)")
 
     # advanced options
     advancedgrp: _ArgumentGroup = parser.add_argument_group("advanced options")
     advancedgrp.add_argument("--update-submodules", dest="updatesubmodules", action='store_true', help="update submodules recursively")
+    advancedgrp.add_argument("-j", "--jobs", type=int, metavar="N", help="number of parallel jobs for submodule updates (default: cpu count)")
     advancedgrp.add_argument("--stash", action='store_true', help="stash changes before pull")
+    advancedgrp.add_argument("--timeout", type=float, metavar="SECONDS", help="deadline for each network step, retries included")
+    advancedgrp.add_argument("--retries", type=int, default=2, metavar="N", help="retry network steps that fail with a temporary error up to N times (default: 2)")
+    advancedgrp.add_argument("--ssh-mux", dest="sshmux", action='store_true', help="share one ssh connection per host between all steps of a run")
+    advancedgrp.add_argument("--coordinate", action='store_true', help="queue behind other meow runs in this repo and share their pushes instead of colliding")
+    advancedgrp.add_argument("--maintenance", action='store_true', help="pack loose objects and update the commit graph in the background after a successful run")
+    advancedgrp.add_argument("--maintenance-budget", dest="maintenancebudget", type=int, default=60, metavar="SECONDS", help="time limit for background maintenance (default: 60)")
     advancedgrp.add_argument("--report", action='store_true', help="generate and output a report after everything is run") # TODO: add option to save to file, and to specify filename
 
+def splitupstream(upstream: List[str]) -> Tuple[str, str]:
+    '''(remote, branch) from the value of --set-upstream, raises InvalidArguments'''
+    remote: str = ""
+    branch: str = ""
+    if len(upstream) == 1 and '/' in upstream[0]:
+        # use REMOTE/BRANCH format, the branch can have slashes of its own
+        remote, branch = upstream[0].split('/', 1)
+    elif len(upstream) == 2:
+        # use REMOTE BRANCH format
+        remote, branch = upstream[0], upstream[1]
+    if not remote or not branch:
+        raise InvalidArguments("invalid upstream format. Use 'REMOTE BRANCH' or 'REMOTE/BRANCH'")
+    return remote, branch
+
 def parseupstreamargs(
         args: Namespace, 
         pushcmd: List[str]
         ) -> List[str]:
-    '''parses args for --set-upstream'''
+    '''parses args for --set-upstream, raises InvalidArguments'''
     pushl = pushcmd
-    if len(args.upstream) == 1 and '/' in args.upstream[0]:
-        # use REMOTE/BRANCH format
-        remote: str
-        branch: str
-        remote, branch = args.upstream[0].split('/')
-        pushl.extend(["--set-upstream", remote, branch])
-    elif len(args.upstream) == 2:
-        # use REMOTE BRANCH format
-        pushl.extend(["--set-upstream", args.upstream[0], args.upstream[1]])
-    else:
-        error("invalid upstream format. Use 'REMOTE BRANCH' or 'REMOTE/BRANCH'")
-        exit(1)
+    remote, branch = splitupstream(args.upstream)
+    pushl.extend(["--set-upstream", remote, branch])
     return pushl
 
 def _getcommitcommand(args: Namespace) -> List[str]:
@@ -159,6 +190,10 @@ def pushcommand(
         return 1, pushcmd
     return 1, []
 
+def getpushremotes(args: Namespace) -> List[str]:
+    '''remotes given to --push-to'''
+    return [remote.strip() for remote in (args.pushto or "").split(',') if remote.strip()]
+
 def statuscommand(
         args: Namespace, 
         pbar: Optional[tqdm]
@@ -255,6 +290,63 @@ def pulldiffcommand(
     info("changes: ", pbar)
     return 1, ["git", "diff", "--numstat", "HEAD@{1}", "HEAD"]
 
+def getgitoutput(cmd: List[str]) -> Optional[str]:
+    '''runs a read-only git command and returns its stripped output, or None on failure'''
+    result: CompletedProcess[bytes] = runsubprocess(cmd, check=False, capture_output=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode('utf-8', errors='replace').strip()
+
+def getgitpath(name: str) -> Optional[str]:
+    '''absolute path of name inside the current repo's .git directory, or None outside a repo'''
+    path: Optional[str] = getgitoutput(["git", "rev-parse", "--git-path", name])
+    return abspath(path) if path is not None else None
+
+class FileLock:
+    '''a flock on path, shared between meow processes. can be held across calls, or for a with block with lockfile()'''
+    def __init__(self, path: str):
+        self.path = path
+        self.fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        '''whether this process holds the lock'''
+        return self.fd is not None
+
+    def acquire(self, exclusive: bool = True, blocking: bool = True) -> bool:
+        '''takes the lock. returns False instead of waiting when blocking is False and someone else holds it'''
+        if self.fd is not None:
+            return True
+        makedirs(dirname(self.path), exist_ok=True)
+        fd: int = osopen(self.path, O_CREAT | O_RDWR, 0o644)
+        try:
+            flock(fd, (LOCK_EX if exclusive else LOCK_SH) | (0 if blocking else LOCK_NB))
+        except BlockingIOError:
+            close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self) -> None:
+        '''lets the next process in. safe to call more than once'''
+        if self.fd is None:
+            return
+        flock(self.fd, LOCK_UN)
+        close(self.fd)
+        self.fd = None
+
+@contextmanager
+def lockfile(path: str, exclusive: bool = True, blocking: bool = True) -> Iterator[bool]:
+    '''
+    holds a flock on path for the duration of the block. yields False instead of waiting
+    when blocking is False and someone else holds the lock
+    '''
+    lock: FileLock = FileLock(path)
+    try:
+        yield lock.acquire(exclusive, blocking)
+    finally:
+        lock.release()
+
 def getgitcommands(
         gitcommand: str, 
         commandarguments: List[str]
@@ -270,18 +362,41 @@ def getgitcommands(
     elif gitcommand == "pull":
         precmd = []
         cmd = ["git", "pull"] + commandarguments + ["--autostash"]
-    elif gitcommand == "clone":
-        precmd = []
-        cmd = ["git", "clone"] + commandarguments + ["--verbose", "--recursive", "--remote-submodules"]
     else:
         precmd = []
         cmd = ["git", gitcommand] + commandarguments
     
     return precmd, cmd
 
+TRANSIENTERRORS: List[str] = [
+    "could not resolve host",
+    "temporary failure in name resolution",
+    "connection timed out",
+    "operation timed out",
+    "connection reset",
+    "connection refused",
+    "broken pipe",
+    "early eof",
+    "unexpected disconnect",
+    "the remote end hung up unexpectedly",
+    "rpc failed",
+    "gnutls_handshake() failed",
+    "ssl_read",
+    "the requested url returned error: 5",
+    "remote: internal server error",
+    "timed out after"
+]
+
+def istransient(errormsg: str) -> bool:
+    '''whether an error looks like a network hiccup that is worth retrying'''
+    msg = errormsg.lower()
+    return any(pattern in msg for pattern in TRANSIENTERRORS)
+
 def suggestfix(errormsg: str) -> str:
     msg = errormsg.lower()
     feedback: List[str] = []
+    if istransient(msg):
+        feedback.append("this looks like a temporary network problem, try again or raise --retries/--timeout")
     if "non-fast-forward" in msg or "rejected" in msg:
         feedback.append("try running `git pull` before pushing, or use --force-with-lease")
     if "permission denied" in msg:
@@ -290,7 +405,7 @@ def suggestfix(errormsg: str) -> str:
         feedback.append(f"    i {Fore.CYAN}everything up to date")
     if "nothing to commit" in msg:
         feedback.append(f"    i {Fore.CYAN}nothing to commit")
-    if "Changes not staged for commit:":
+    if "changes not staged for commit" in msg:
         feedback.append(f"    i {Fore.CYAN}there are unstaged changes") # TODO: find out how to print unstaged files
     
     return "\n".join(feedback)
@@ -380,29 +495,200 @@ def runcmd(
                 success("    ✓ completed successfully", pbar)
             return result
     except CalledProcessError as e:
-        if pbar is not None:
-            pbar.colour = 'magenta'
-            pbar.refresh()
-        error(f"\n❌ command failed with exit code {e.returncode}:", pbar)
-        printcmd(f"  $ {cmdstr}", pbar)
-        outstr: str = e.stdout.decode('utf-8', errors='replace') if e.stdout else ""
-        errstr: str = e.stderr.decode('utf-8', errors='replace') if e.stderr else ""
-        if outstr:
-            info(f"{Fore.BLACK}{outstr}", pbar)
-        if errstr:
-            error(f"{Fore.RED}{errstr}", pbar)
-            suggestion = suggestfix(errstr)
-            if suggestion:
-                error(suggestion, pbar)
-        if not flags.cont:
-            exit(e.returncode)
-        else:
-            info(f"{Fore.CYAN}continuing...", pbar)
-        return None
+        failstep(e.returncode, flags, pbar, [(e.returncode, cmdstr, e.stdout, e.stderr)])
+        # the failed process, so callers going on with --continue can tell it apart from a command that didn't run
+        return CompletedProcess(e.cmd, e.returncode, e.stdout or b"", e.stderr or b"")
     except KeyboardInterrupt:
         error(f"{Fore.CYAN}user interrupted", pbar)
         return None
 
+def failstep(
+        returncode: int,
+        flags: Namespace,
+        pbar: Optional[tqdm],
+        failures: Optional[List[FailureType]] = None
+        ) -> None:
+    '''
+    ends a failed step: turns the bar magenta, shows each failed (returncode, command, stdout, stderr),
+    and exits with returncode unless --continue
+    '''
+    if pbar is not None:
+        pbar.colour = 'magenta'
+        pbar.refresh()
+    for failure in failures or []:
+        showfailure(*failure, pbar)
+    if not flags.cont:
+        exit(returncode)
+    info(f"{Fore.CYAN}continuing...", pbar)
+
+def showfailure(
+        returncode: int,
+        cmdstr: str,
+        stdout: Optional[bytes],
+        stderr: Optional[bytes],
+        pbar: Optional[tqdm]
+        ) -> None:
+    '''prints a failed command with its output and a suggested fix'''
+    error(f"\n❌ command failed with exit code {returncode}:", pbar)
+    printcmd(f"  $ {cmdstr}", pbar)
+    outstr: str = stdout.decode('utf-8', errors='replace') if stdout else ""
+    errstr: str = stderr.decode('utf-8', errors='replace') if stderr else ""
+    if outstr:
+        info(f"{Fore.BLACK}{outstr}", pbar)
+    if errstr:
+        error(f"{Fore.RED}{errstr}", pbar)
+        suggestion = suggestfix(errstr)
+        if suggestion:
+            error(suggestion, pbar)
+
+def getjobs(flags: Namespace) -> int:
+    '''number of parallel jobs to use (--jobs, defaults to the cpu count)'''
+    jobs: Optional[int] = getattr(flags, "jobs", None)
+    return max(1, jobs if jobs else (cpu_count() or 1))
+
+def runparallel(
+        cmds: Dict[str, List[str]],
+        jobs: int,
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        runner: Optional[Callable[[List[str]], CompletedProcess[bytes]]] = None
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''
+    runs independent commands concurrently, printing a line per command as it finishes.
+    runner runs one command, a plain subprocess by default.
+    returns one CompletedProcess summarising every command, with the first failing exit code
+    '''
+    if not cmds:
+        return None
+
+    if flags.dry:
+        for cmd in cmds.values():
+            printcmd(list2cmdline(cmd), pbar)
+        return None
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    currentdirectory: str = getcwd()
+
+    def _run(cmd: List[str]) -> Tuple[CompletedProcess[bytes], float]:
+        start: float = time()
+        result: CompletedProcess[bytes] = runner(cmd) if runner else runsubprocess(cmd, check=False, cwd=currentdirectory, capture_output=True)
+        return result, time() - start
+
+    info(f"    running {len(cmds)} commands ({min(jobs, len(cmds))} at a time):", pbar)
+    results: Dict[str, Tuple[CompletedProcess[bytes], float]] = {}
+    with tqdm(
+        total=len(cmds),
+        desc=f"{Fore.CYAN}mrrping...{Style.RESET_ALL}",
+        bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}',
+        position=1,
+        leave=False
+    ) as inner_pbar, ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_run, cmd): label for label, cmd in cmds.items()}
+        for future in as_completed(futures):
+            label: str = futures[future]
+            result, duration = future.result()
+            results[label] = (result, duration)
+            if result.returncode == 0:
+                success(f"    ✓ {label} ({duration:.2f}s)", pbar)
+            else:
+                error(f"    ✗ {label} failed with exit code {result.returncode} ({duration:.2f}s)", pbar)
+            inner_pbar.update(1)
+
+    lines: List[str] = []
+    failed: List[str] = []
+    for label, cmd in cmds.items():
+        result, duration = results[label]
+        if result.returncode == 0:
+            lines.append(f"{label}: ok in {duration:.2f} seconds")
+        else:
+            lines.append(f"{label}: exit code {result.returncode} in {duration:.2f} seconds")
+            failed.append(label)
+
+    returncode: int = 0
+    if failed:
+        returncode = results[failed[0]][0].returncode
+        failstep(returncode, flags, pbar, [
+            (results[label][0].returncode, list2cmdline(cmds[label]), results[label][0].stdout, results[label][0].stderr)
+            for label in failed
+        ])
+
+    return CompletedProcess(
+        args=list(cmds.values()),
+        returncode=returncode,
+        stdout="\n".join(lines).encode("utf-8"),
+        stderr=b""
+    )
+
+def getstalesubmodules() -> List[Tuple[str, str]]:
+    '''
+    lists (state, path) for top-level submodules whose checkout doesn't match the recorded gitlink,
+    or that contain a nested submodule that doesn't. state is the `git submodule status` prefix
+    '''
+    result: CompletedProcess[bytes] = runsubprocess(
+        ["git", "submodule", "status", "--recursive"], check=False, capture_output=True
+    )
+    if result.returncode != 0:
+        return []
+
+    entries: List[Tuple[str, str]] = []
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        if len(line) < 2:
+            continue
+        state: str = line[0]
+        path: str = line[1:].split(' ', 1)[1] if ' ' in line[1:] else ""
+        if path.endswith(')') and ' (' in path:
+            path = path.rsplit(' (', 1)[0]
+        if path:
+            entries.append((state, path))
+
+    paths: List[str] = [path for _, path in entries]
+    toplevel: Dict[str, str] = {
+        path: state for state, path in entries
+        if not any(path.startswith(f"{other}/") for other in paths)
+    }
+
+    stale: Set[str] = set()
+    for state, path in entries:
+        if state == ' ':
+            continue
+        for top in toplevel:
+            if path == top or path.startswith(f"{top}/"):
+                stale.add(top)
+                break
+
+    return [(toplevel[path], path) for path in paths if path in stale]
+
+def runsubmodulesupdate(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = True
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''
+    runs `cmd` once per out-of-date submodule, --jobs at a time.
+    submodules whose checkout already matches the recorded gitlink are skipped
+    '''
+    if not cmd:
+        return None
+
+    stale: List[Tuple[str, str]] = getstalesubmodules()
+    if not stale:
+        info(f"    i {Fore.CYAN}all submodules up to date", pbar)
+        return CompletedProcess(args=cmd, returncode=0, stdout=b"all submodules up to date", stderr=b"")
+
+    # init writes to the superproject's config, so it can't run concurrently
+    uninitialized: List[str] = [path for state, path in stale if state == '-']
+    if uninitialized:
+        runcmd(cmd=["git", "submodule", "init", "--", *uninitialized], flags=flags, pbar=pbar, withprogress=False, printsuccess=False)
+
+    updatecmd: List[str] = cmd + (["--quiet"] if flags.quiet else [])
+    return runparallel(
+        cmds={path: updatecmd + ["--", path] for _, path in stale},
+        jobs=getjobs(flags),
+        flags=flags,
+        pbar=pbar
+    )
+
 @contextmanager
 def incrementprogress(pbar: tqdm, by: int = 1):
     start = time()
@@ -0,0 +1,8 @@
+from main import cli
+
+'''
+entry point for the pyinstaller build, so main itself can be compiled with cython
+'''
+
+if __name__ == "__main__":
+    cli()
@@ -1,16 +1,41 @@
 from sys import exit
 from tqdm import tqdm
+from threading import local
+from contextlib import contextmanager
 from argparse import Namespace
 from colorama import Fore, Style
-from typing import Optional, List, NoReturn
+from typing import Optional, List, NoReturn, Tuple, Iterator
 from subprocess import list2cmdline, CompletedProcess
 
+try:
+    import cython # type: ignore
+except ImportError:
+    import cythonshim as cython # type: ignore
+
 '''
 things that log
 '''
 
+_state = local()
+
+def ismuted() -> bool:
+    '''whether output is muted on this thread'''
+    return getattr(_state, "muted", False)
+
+@contextmanager
+def muted() -> Iterator[None]:
+    '''silences every logger on the current thread for the duration of the block, other threads keep printing'''
+    previous: bool = ismuted()
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
 def success(message: str, pbar: Optional[tqdm] = None) -> None:
     '''print success message'''
+    if ismuted():
+        return
     if pbar:
         pbar.write(f"{Fore.GREEN}{Style.BRIGHT}{message}")
     else:
@@ -18,6 +43,8 @@ def success(message: str, pbar: Optional[tqdm] = None) -> None:
 
 def error(message: str, pbar: Optional[tqdm] = None) -> None:
     '''print error message'''
+    if ismuted():
+        return
     if pbar:
         pbar.write(f"{Fore.MAGENTA}{Style.BRIGHT}{message}")
     else:
@@ -25,6 +52,8 @@ def error(message: str, pbar: Optional[tqdm] = None) -> None:
 
 def info(message: str, pbar: Optional[tqdm] = None) -> None:
     '''print info message'''
+    if ismuted():
+        return
     if pbar:
         pbar.write(f"{Fore.BLUE}{message}")
     else:
@@ -32,6 +61,8 @@ def info(message: str, pbar: Optional[tqdm] = None) -> None:
 
 def warning(message: str, pbar: Optional[tqdm] = None) -> None:
     '''print warning message'''
+    if ismuted():
+        return
     if pbar:
         pbar.write(f"{Fore.YELLOW}{Style.DIM}{message}")
     else:
@@ -39,6 +70,8 @@ def warning(message: str, pbar: Optional[tqdm] = None) -> None:
 
 def printcmd(cmd: str, pbar: Optional[tqdm] = None) -> None:
     '''prints a command'''
+    if ismuted():
+        return
     if pbar:
         pbar.write(f"{Fore.CYAN}{cmd}")
     else:
@@ -50,12 +83,17 @@ def printinfo(version: str) -> NoReturn:
     print(f"{Fore.BLUE}https://github.com/ellipticobj/meower{Style.RESET_ALL}")
     exit(1)
 
-def printdiff(outputstr: str, pbar: Optional[tqdm]) -> None:
-    additions = 0
-    deletions = 0
-    files = []
-    
-    # process git output
+@cython.ccall
+def parsenumstat(outputstr: str) -> Tuple[list, cython.Py_ssize_t, cython.Py_ssize_t]:
+    '''parses `git diff --numstat` output into ([(file, additions, deletions)], additions, deletions)'''
+    additions: cython.Py_ssize_t = 0
+    deletions: cython.Py_ssize_t = 0
+    add: cython.Py_ssize_t
+    rem: cython.Py_ssize_t
+    files: list = []
+    line: str
+    parts: list
+
     for line in outputstr.split('\n'):
         if not line:
             continue
@@ -63,10 +101,14 @@ def printdiff(outputstr: str, pbar: Optional[tqdm]) -> None:
         if len(parts) >= 3:
             add = int(parts[0]) if parts[0].isdigit() else 0
             rem = int(parts[1]) if parts[1].isdigit() else 0
-            fname = parts[2]
-            files.append((fname, add, rem))
+            files.append((parts[2], add, rem))
             additions += add
             deletions += rem
+
+    return files, additions, deletions
+
+def printdiff(outputstr: str, pbar: Optional[tqdm]) -> None:
+    files, additions, deletions = parsenumstat(outputstr)
     
     # print formatted text
     for fname, add, rem in files:
@@ -81,6 +123,26 @@ def printdiff(outputstr: str, pbar: Optional[tqdm]) -> None:
     info(f"    {Fore.GREEN}{additions} insertions(+){Style.RESET_ALL}", pbar=pbar)
     info(f"    {Fore.RED}{deletions} deletions(-){Style.RESET_ALL}", pbar=pbar)
 
+@cython.ccall
+def classifyoutput(outputstr: str, verbose: cython.bint, messagestr: str) -> str:
+    '''
+    decides how printoutput shows a command's output:
+    "all", "uptodate", "nothingtocommit", "modes", "short" or "" to show nothing
+    '''
+    if not outputstr:
+        return ""
+    if verbose:
+        return "all"
+    if 'Everything up-to-date' in outputstr:
+        return "uptodate"
+    if 'nothing to commit' in outputstr:
+        return "nothingtocommit"
+    if 'create mode' in outputstr or 'delete mode' in outputstr:
+        return "modes"
+    if len(outputstr) < 200 and messagestr not in outputstr: # dont duplicate commit message
+        return "short"
+    return ""
+
 def printoutput(
         result: CompletedProcess[bytes], 
         flags: Namespace, 
@@ -98,27 +160,23 @@ def printoutput(
         pbar.n = 80
         pbar.refresh()
 
-    if outputstr:
-        if flags.verbose:
-            # output everything
-            info(f"    i {Fore.CYAN}{outputstr}", mainpbar)
-        else:
-            messagestr = " ".join(flags.message) if isinstance(flags.message, list) else flags.message
-            # check for specific outputs
-            if 'Everything up-to-date' in outputstr:
-                info(f"    i {Fore.CYAN}everything up-to-date", mainpbar)
-            elif 'nothing to commit' in outputstr:
-                info(f"    i {Fore.CYAN}nothing to commit", mainpbar)
-            elif 'create mode' in outputstr or 'delete mode' in outputstr:
-                # show additions/deletions
-                outputl: List[str] = outputstr.split('\n')
-                for line in outputl: # make sure everything is indented properly
-                    info(f"    i {Fore.BLACK}{line}", mainpbar)
-            elif len(outputstr) < 200:  # show short messages
-                if messagestr in outputstr: # dont duplicate commit message
-                    pass
-                else:
-                    info(f"    i {Fore.BLACK}{outputstr}", mainpbar)
+    messagestr: str = ""
+    if not flags.verbose:
+        messagestr = (" ".join(flags.message) if isinstance(flags.message, list) else flags.message) or ""
+    kind: str = classifyoutput(outputstr, flags.verbose, messagestr)
+    if kind == "all":
+        # output everything
+        info(f"    i {Fore.CYAN}{outputstr}", mainpbar)
+    elif kind == "uptodate":
+        info(f"    i {Fore.CYAN}everything up-to-date", mainpbar)
+    elif kind == "nothingtocommit":
+        info(f"    i {Fore.CYAN}nothing to commit", mainpbar)
+    elif kind == "modes":
+        # show additions/deletions
+        for line in outputstr.split('\n'): # make sure everything is indented properly
+            info(f"    i {Fore.BLACK}{line}", mainpbar)
+    elif kind == "short":
+        info(f"    i {Fore.BLACK}{outputstr}", mainpbar)
 
 def formatcommit(
         commit_hash: str, 
@@ -1,23 +1,25 @@
 from os import getcwd
 from time import time
 from tqdm import tqdm
+import sys
 from sys import exit, argv
 from collections.abc import Callable
 from colorama import init, Fore, Style
 from subprocess import CompletedProcess
 from argparse import ArgumentParser, Namespace
-from typing import List, Optional, Final, Dict, Union, Tuple
+from typing import List, Optional, Final, Tuple
 from loaders import startloadinganimation, stoploadinganimation, ThreadEventTuple
-from loggers import success, info, printinfo, spacer
-from helpers import completebar, initcommands, validateargs, pushcommand, statuscommand, submodulesupdatecommand, \
-    stashcommand, pullcommand, stagecommand, diffcommand, commitcommand, pulldiffcommand, runcmd, GITCOMMANDMESSAGES, \
-    incrementprogress
+from loggers import error, success, info, printinfo, spacer
+from errors import MeowError, InvalidArguments
+from helpers import completebar, initcommands, validateargs, runcmd, GITCOMMANDMESSAGES
+from pipeline import PipelineStep, Pipeline, getsteps
+from reports import StepReport, formatreport
 
 '''
 main entry point
 
 file pipeline:
-loaders -> loggers -> helpers -> githandler -> main
+loaders -> loggers -> errors, reports -> helpers -> network -> clone, prefetch, watcher, tune, sshmux, checks, preflight, checkpoint -> maintenance, coordinator -> pipeline -> githandler -> main, api
 '''
 
 # initialize colorama
@@ -27,53 +29,6 @@ VERSION: Final[str] = "0.2.5-preview5"
 
 KNOWNCMDS: List[str] = list(GITCOMMANDMESSAGES.keys())
 
-class PipelineStep:
-    '''step in the pipeline'''
-    def __init__(self, name: str, func: Callable[[Namespace, Optional[tqdm]], Tuple[int, List[str]]], nopbar: bool = False):
-        self.name = name
-        self.func = func
-        self.nopbar = nopbar
-
-    def execute(self, args: Namespace, pbar: Optional[tqdm]) -> Tuple[Dict[str, Union[str, float, int]], int]:
-        '''execute the step'''
-        start = time()
-        toadd, cmd = self.func(args, pbar=pbar) # type: ignore
-
-        result: Optional[CompletedProcess[bytes]] = runcmd(
-            cmd=cmd,
-            flags=args,
-            pbar=pbar,
-            withprogress=not self.nopbar
-        )
-        duration = time() - start
-        report = {
-            "step": self.name,
-            "command": " ".join(cmd) if cmd else "",
-            "duration": duration,
-            "output": result.stdout.decode("utf-8", errors="replace") if result else "",
-            "returncode": result.returncode if result else ""
-        }
-        return report, toadd # type: ignore
-    
-class Pipeline:
-    '''pipeline'''
-    def __init__(self, args: Namespace, steps: List[PipelineStep], pbar: tqdm):
-        self.args = args
-        self.steps = steps
-        self.pbar = pbar
-        self.report: List[Dict[str, Union[str, float]]] = []
-
-    def run(self) -> None:
-        '''loops through items in self.steps and runs them'''
-        starttime = time()
-        for step in self.steps:
-            reportitem, toadd = step.execute(self.args, self.pbar)
-            with incrementprogress(self.pbar, by=toadd):
-                self.report.append(reportitem)
-        totaltime = time() - starttime
-        self.report.append({"step": "TOTAL", "duration": totaltime})
-        completebar(self.pbar, self.pbar.total)
-
 def checkargv(
         args: List[str], 
         parser: ArgumentParser
@@ -90,58 +45,20 @@ def checkargv(
         elif args[1] in KNOWNCMDS:
             from githandler import handlegitcommands
             handlegitcommands(args, GITCOMMANDMESSAGES)
+        elif args[1] == "watch":
+            from watcher import handlewatch
+            handlewatch(args[2:])
+        elif args[1] == "tune":
+            from tune import handletune
+            handletune(args[2:])
+        elif args[1] == "maintenance":
+            from maintenance import handlemaintenance
+            handlemaintenance(args[2:])
     return None
 
-def getsteps(args: Namespace) -> List[PipelineStep]:
-    '''gets the commands the program has to complete'''
-    steps: List[PipelineStep] = []
-
-    # get status
-    if args.status:
-        steps.append(PipelineStep("get status", statuscommand, nopbar=True))
-
-    # update submodules
-    if args.updatesubmodules:
-        steps.append(PipelineStep("update submodules", submodulesupdatecommand))
-
-    # stash
-    if args.stash:
-        steps.append(PipelineStep("stash changes", stashcommand))
-    
-    # pull
-    if args.pull or args.norebase:
-        steps.append(PipelineStep("pull from remote", pullcommand))
-        steps.append(PipelineStep("get pull diff", pulldiffcommand, nopbar=True))
-    
-    # stage changes
-    steps.append(PipelineStep("stage changes", stagecommand))
-    if args.diff:
-        steps.append(PipelineStep("get diff", diffcommand, nopbar=True))
-    
-    # commit changes
-    steps.append(PipelineStep("commit changes", commitcommand))
-
-    # push
-    if not args.nopush:
-        steps.append(PipelineStep("push changes", pushcommand))
-    
-    return steps
-
-def generatereport(report: List[dict], totaltime: float, pbar: Optional[tqdm] = None, savetofile: Optional[str] = None) -> None:
+def generatereport(report: List[StepReport], totaltime: float, pbar: Optional[tqdm] = None, savetofile: Optional[str] = None) -> None:
     '''generates a report of the pipeline'''
-    output: List[str] = []
-    output.append("\n")
-    output.append("report:\n")
-    for i, step in enumerate(report, start=1):
-        output.append(f"step: {step['step']}\n")
-        output.append(f"  command: {step.get('command', 'N/A')}\n")
-        output.append(f"  duration: {step['duration']:.8f} seconds\n")
-        if step.get("output"):
-            output.append(f"  output: {step['output']}\n")
-        if step.get("returncode"):
-            output.append(f"  return code: {step['returncode']}\n")
-        output.append("\n")
-    output.append(f"total duration: {totaltime:.8f} seconds\n")
+    output: List[str] = formatreport(report, totaltime)
 
     if savetofile:
         with open(savetofile, 'w') as f:
@@ -175,7 +92,7 @@ def runandreporton(
         printsuccess: bool = True, 
         customsuccess: str = "", 
         printcmd: Optional[Callable] = None
-        ) -> Tuple[ Dict[str, Union[str, float, List[str]]], int]:
+        ) -> Tuple[StepReport, int]:
     '''
     runs a command returned by func, 
     and returns a tuple with the report generated, and the number of steps completed
@@ -189,33 +106,71 @@ def runandreporton(
         output = runcmd(cmd=cmd, flags=flags, pbar=pbar, printsuccess=printsuccess)
     else:
         output = runcmd(cmd=cmd, pbar=pbar, printsuccess=printsuccess, withprogress=False)
-    if output and printcmd:
+    if output and output.returncode == 0 and printcmd:
         outputstr: str = output.stdout.decode('utf-8', errors='replace').strip()
         printcmd(outputstr, pbar)
         success(customsuccess, pbar)
             
     duration = time() - stepstart
-    return {
-        "step": stepname,
-        "command": " ".join(cmd) if cmd else "",
-        "duration": duration,
-        "output": output.stdout.decode('utf-8', errors='replace') if output else "",
-        "returncode": output.returncode if output else ""
-    }, toadd
+    return StepReport(
+        step=stepname,
+        command=" ".join(cmd) if cmd else "",
+        duration=duration,
+        output=output.stdout.decode('utf-8', errors='replace') if output else "",
+        returncode=output.returncode if output else None
+    ), toadd
 
 def runpipeline(args: Namespace) -> None:
+    # modules for optional features are imported where they're used, so runs without them start faster
+    from checkpoint import Checkpoint
+
+    # steps finished by the run being resumed are skipped
+    checkpoint: Optional[Checkpoint] = None if args.dry else getattr(args, "checkpoint", None) or Checkpoint(argv[1:])
+    finished: List[str] = checkpoint.completedsteps if checkpoint else []
+    resumed: List[StepReport] = [StepReport(step=name, output="finished before --resume") for name in finished]
+
     # show pipeline overview
-    steps = getsteps(args)
+    steps = [step for step in getsteps(args) if step.name not in finished]
     totalsteps: int = len(steps)
 
     displaysteps(steps)
 
     # execute pipeline
     with tqdm(total=len(steps), desc=f"{Fore.RED}meowing...{Style.RESET_ALL}", bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt}', position=0, leave=True) as pbar:
-        pipeline = Pipeline(args, steps, pbar)
-        pipeline.run()
-
-        totaltime: int = int(pipeline.report[-1].get("duration", 0))
+        pipeline = Pipeline(args, steps, pbar, checkpoint)
+        if args.coordinate and not args.dry:
+            from coordinator import Coordinator
+            args.coordinator = Coordinator()
+            args.coordinator.start(pbar)
+        mux = None
+        if args.sshmux and not args.dry:
+            from sshmux import SshMultiplexer
+            mux = SshMultiplexer()
+            mux.start(pbar)
+        try:
+            pipeline.run()
+        finally:
+            if mux:
+                mux.stop()
+            if args.coordinate and not args.dry:
+                args.coordinator.finish()
+        if mux:
+            pipeline.report.insert(len(pipeline.report) - 1, mux.report())
+        pipeline.report[0:0] = resumed
+
+        if args.prefetch and not args.dry:
+            from prefetch import startprefetch
+            startprefetch(args.prefetchinterval, pbar)
+
+        if args.maintenance:
+            from maintenance import collectmaintenance, startmaintenance
+            if not args.dry and not pipeline.failures:
+                startmaintenance(args.maintenancebudget, pbar)
+            # results of the maintenance started by the previous run, shown before TOTAL
+            last: int = len(pipeline.report) - 1
+            pipeline.report[last:last] = collectmaintenance()
+
+        totaltime: int = int(pipeline.report[len(pipeline.report) - 1].duration)
 
         if args.report:
             generatereport(report=pipeline.report, totaltime=totaltime)
@@ -239,12 +194,23 @@ def main() -> None:
     args: Namespace = parser.parse_args()
     displayheader()
 
+    if args.resume:
+        from checkpoint import loadcheckpoint
+        checkpoint = loadcheckpoint()
+        args = parser.parse_args(checkpoint.argv)
+        args.checkpoint = checkpoint
+        info(f"resuming `meow {' '.join(checkpoint.argv)}`, skipping: {', '.join(checkpoint.completedsteps) or 'nothing'}")
+
     if args.dry:
         print(f"\n{Fore.MAGENTA}{Style.BRIGHT}dry run{Style.RESET_ALL}")
     if args.version:
         printinfo(VERSION)
 
-    validateargs(args)
+    try:
+        validateargs(args)
+    except InvalidArguments as e:
+        error(f"error: {e}")
+        exit(1)
 
     preparinganimation: ThreadEventTuple = startloadinganimation("preparing...")
     stoploadinganimation(preparinganimation)
@@ -254,11 +220,23 @@ def main() -> None:
 
     print("\n😺")
 
-if __name__ == "__main__":
+def cli() -> None:
+    '''main() with top-level error handling, used by `python main.py` and launcher.py'''
+    # lets process pool workers of a frozen build start up as workers instead of as meow.
+    # only frozen builds need it, and importing multiprocessing costs every other run its startup time
+    if getattr(sys, "frozen", False):
+        from multiprocessing import freeze_support
+        freeze_support()
     try:
         main()
     except KeyboardInterrupt:
         print(f"\n\n{Fore.YELLOW}{Style.BRIGHT}operation cancelled by user{Style.RESET_ALL}")
         exit(1)
+    except MeowError as e:
+        error(f"error: {e}")
+        exit(1)
     except Exception as e:
         print(f"\n\n{Fore.MAGENTA}{Style.BRIGHT}error: {Style.RESET_ALL}{Fore.RED}{e}{Style.RESET_ALL}")
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,154 @@
+import sys
+from json import dump, load
+from shutil import which
+from time import time, strftime, localtime
+from tqdm import tqdm
+from colorama import Fore
+from argparse import ArgumentParser, Namespace
+from os import cpu_count, getloadavg, getpid, makedirs, nice, remove, replace
+from os.path import abspath, dirname, exists
+from typing import Dict, List, Optional, Union
+from subprocess import Popen, TimeoutExpired, run as runsubprocess, DEVNULL
+from loggers import info
+from reports import StepReport
+from helpers import getgitpath, lockfile
+
+'''
+cheap background maintenance for --maintenance
+'''
+
+# cheapest first, so a short budget still gets the commit graph done
+TASKS: List[str] = ["commit-graph", "loose-objects", "incremental-repack"]
+RESULTSFILE: str = "meow/maintenance.json"
+LOCKFILE: str = "meow/maintenance.lock"
+
+RecordType = Dict[str, Union[str, int, float, None]]
+
+def getselfcommand() -> List[str]:
+    '''how to start meow again: the executable itself when frozen, the interpreter and script otherwise'''
+    if getattr(sys, "frozen", False):
+        return [sys.executable]
+    return [sys.executable, abspath(sys.argv[0])]
+
+def startmaintenance(budget: int, pbar: Optional[tqdm] = None) -> bool:
+    '''starts `meow maintenance` detached from this run. returns whether it was started'''
+    if getgitpath(LOCKFILE) is None:
+        return False
+    Popen(
+        getselfcommand() + ["maintenance", "--budget", str(budget)],
+        stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, start_new_session=True
+    )
+    info(f"    i {Fore.CYAN}running maintenance in the background", pbar)
+    return True
+
+def lowerpriority() -> None:
+    '''lowest cpu priority, and idle io priority where ionice exists. git inherits both'''
+    nice(19)
+    if which("ionice"):
+        runsubprocess(["ionice", "-c", "3", "-p", str(getpid())], stdout=DEVNULL, stderr=DEVNULL, check=False)
+
+def isidle() -> bool:
+    '''whether nothing else is writing to the repo and the machine isn't busy'''
+    indexlock: Optional[str] = getgitpath("index.lock")
+    if indexlock is None or exists(indexlock):
+        return False
+    return getloadavg()[0] < (cpu_count() or 1)
+
+def runtask(task: str, timeout: float) -> RecordType:
+    '''runs one maintenance task, stopping it when timeout runs out'''
+    cmd: List[str] = ["git", "maintenance", "run", "--quiet", f"--task={task}"]
+    start: float = time()
+    proc: Popen = Popen(cmd, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL)
+    try:
+        returncode: int = proc.wait(timeout=timeout)
+        outcome: str = "ok" if returncode == 0 else f"failed with exit code {returncode}"
+    except TimeoutExpired:
+        proc.terminate()
+        returncode = proc.wait()
+        outcome = "stopped, out of time budget"
+    return {
+        "task": task,
+        "command": " ".join(cmd),
+        "duration": time() - start,
+        "returncode": returncode,
+        "outcome": outcome,
+    }
+
+def skipped(task: str, reason: str) -> RecordType:
+    '''record of a task that didn't run'''
+    return {"task": task, "command": None, "duration": 0.0, "returncode": None, "outcome": f"skipped, {reason}"}
+
+def saveresults(records: List[RecordType]) -> None:
+    '''adds records to the results file, keeping those the next run hasn't shown yet'''
+    path: Optional[str] = getgitpath(RESULTSFILE)
+    if path is None:
+        return
+    makedirs(dirname(path), exist_ok=True)
+    try:
+        with open(path) as f:
+            records = load(f) + records
+    except (OSError, ValueError):
+        pass
+    with open(f"{path}.tmp", 'w') as f:
+        dump(records, f)
+    replace(f"{path}.tmp", path)
+
+def runmaintenance(budget: int) -> None:
+    '''runs TASKS while the repo is idle and the budget lasts. only one instance runs per repo'''
+    lock: Optional[str] = getgitpath(LOCKFILE)
+    if lock is None:
+        return
+    with lockfile(lock, blocking=False) as locked:
+        if not locked:
+            return
+        lowerpriority()
+        deadline: float = time() + budget
+        records: List[RecordType] = []
+        for task in TASKS:
+            remaining: float = deadline - time()
+            if remaining <= 0:
+                records.append(skipped(task, "out of time budget"))
+            elif not isidle():
+                records.append(skipped(task, "repo or machine busy"))
+            else:
+                records.append(runtask(task, remaining))
+        finished: str = strftime("%H:%M:%S", localtime())
+        for record in records:
+            record["outcome"] = f"{record['outcome']} (finished at {finished})"
+        saveresults(records)
+
+def collectmaintenance() -> List[StepReport]:
+    '''report rows for the maintenance that ran since the last run. each result is shown once'''
+    path: Optional[str] = getgitpath(RESULTSFILE)
+    if path is None:
+        return []
+    # take the file away first, a maintenance run finishing right now starts a new one
+    try:
+        replace(path, f"{path}.read")
+    except OSError:
+        return []
+    try:
+        with open(f"{path}.read") as f:
+            records: List[RecordType] = load(f)
+    except (OSError, ValueError):
+        records = []
+    remove(f"{path}.read")
+
+    return [
+        StepReport(
+            step=f"maintenance: {record['task']}",
+            command=record["command"],
+            duration=float(record["duration"] or 0.0),
+            output=str(record["outcome"]),
+            returncode=record["returncode"]
+        )
+        for record in records
+    ]
+
+def handlemaintenance(maintenanceargs: List[str]) -> None:
+    '''handles meow maintenance, started in the background by --maintenance'''
+    parser: ArgumentParser = ArgumentParser(prog="meow maintenance", description="run background maintenance for this repo")
+    parser.add_argument("--budget", type=int, default=60, metavar="SECONDS", help="time limit for all tasks (default: 60)")
+    args: Namespace = parser.parse_args(maintenanceargs)
+    runmaintenance(args.budget)
+    sys.exit(0)
@@ -0,0 +1,233 @@
+from sys import exit
+from time import time, sleep
+from tqdm import tqdm
+from random import uniform
+from threading import Thread
+from argparse import Namespace
+from queue import Queue, Empty
+from os import getcwd
+from typing import List, Tuple, Optional, Dict, Union, Final
+from subprocess import list2cmdline, Popen, PIPE, CompletedProcess
+from loggers import error, info, success, warning, printcmd, printoutput
+from loaders import startloadinganimation, stoploadinganimation
+from helpers import MinimalNamespace, GITCOMMANDMESSAGES, istransient, failstep, getpushremotes, runparallel
+
+'''
+network commands with deadlines, retries and hedging
+'''
+
+DEFAULTRETRIES: Final[int] = 2
+BACKOFFBASE: Final[float] = 0.5 # seconds before the first retry
+BACKOFFCAP: Final[float] = 30.0
+TIMEOUTCODE: Final[int] = 124 # same as coreutils timeout
+HEDGEABLE: Final[List[str]] = ["fetch", "ls-remote"] # safe to run twice at the same time
+GLOBALOPTIONS: Final[List[str]] = ["-C", "-c"] # git options before the subcommand that take a value
+
+AttemptType = Dict[str, Union[int, float, str]]
+
+class AttemptedProcess(CompletedProcess):
+    '''CompletedProcess that remembers every attempt it took to get there'''
+    def __init__(self, result: CompletedProcess, attempts: List[AttemptType]):
+        super().__init__(result.args, result.returncode, result.stdout, result.stderr)
+        self.attempts = attempts
+
+def getbackoff(attempt: int) -> float:
+    '''jittered exponential backoff before retry number attempt'''
+    return uniform(0, min(BACKOFFCAP, BACKOFFBASE * 2 ** attempt))
+
+def getsubcommand(cmd: List[str]) -> str:
+    '''the git subcommand of cmd, past global options like -C <dir>'''
+    i: int = 1
+    while i < len(cmd) and cmd[i] in GLOBALOPTIONS:
+        i += 2
+    return cmd[i] if i < len(cmd) else ""
+
+def ishedgeable(cmd: List[str]) -> bool:
+    '''whether two copies of cmd can race without harm'''
+    return len(cmd) > 1 and cmd[0] == "git" and getsubcommand(cmd) in HEDGEABLE
+
+def parsenetworkargs(commandarguments: List[str]) -> Tuple[Namespace, List[str]]:
+    '''
+    splits the meow flags for network commands (--timeout, --retries, --hedge) from the arguments passed to git,
+    for meow clone, fetch, pull and push
+    '''
+    values: Dict[str, Optional[float]] = {"timeout": None, "retries": DEFAULTRETRIES, "hedge": None}
+    gitargs: List[str] = []
+
+    i: int = 0
+    while i < len(commandarguments):
+        arg: str = commandarguments[i]
+        flag, _, value = arg.partition('=')
+        if flag in ("--timeout", "--retries", "--hedge"):
+            if not value:
+                i += 1
+                value = commandarguments[i] if i < len(commandarguments) else ""
+            try:
+                number: float = int(value) if flag == "--retries" else float(value)
+            except ValueError:
+                number = -1
+            if number < 0:
+                error(f"error: {flag} needs a number of {'attempts' if flag == '--retries' else 'seconds'}")
+                exit(1)
+            values[flag[2:]] = number
+        else:
+            gitargs.append(arg)
+        i += 1
+
+    return Namespace(**{**vars(MinimalNamespace), **values}), gitargs
+
+def _attempt(
+        cmd: List[str],
+        timeout: Optional[float],
+        hedge: Optional[float]
+        ) -> Tuple[CompletedProcess[bytes], str]:
+    '''
+    private function to run cmd once, killing it after timeout seconds.
+    if hedge is set, a second copy starts when the first hasn't finished after hedge seconds,
+    and the first one to succeed wins
+    '''
+    start: float = time()
+    currentdirectory: str = getcwd()
+    procs: List[Popen] = []
+    results: "Queue[Tuple[int, CompletedProcess[bytes]]]" = Queue()
+
+    def _launch() -> None:
+        proc: Popen = Popen(cmd, stdout=PIPE, stderr=PIPE, cwd=currentdirectory)
+        index: int = len(procs)
+        procs.append(proc)
+
+        def _wait() -> None:
+            out, err = proc.communicate()
+            results.put((index, CompletedProcess(cmd, proc.returncode, out, err)))
+        Thread(target=_wait, daemon=True).start()
+
+    def _stop() -> None:
+        # SIGTERM lets git remove its lock files
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+
+    _launch()
+    hedged: bool = hedge is None
+    finished: int = 0
+    try:
+        while True:
+            elapsed: float = time() - start
+            waits: List[float] = []
+            if timeout is not None:
+                waits.append(timeout - elapsed)
+            if not hedged and hedge is not None:
+                waits.append(hedge - elapsed)
+            try:
+                index, result = results.get(timeout=max(0.0, min(waits)) if waits else None)
+            except Empty:
+                if timeout is not None and time() - start >= timeout:
+                    _stop()
+                    return CompletedProcess(
+                        cmd, TIMEOUTCODE, b"", f"meow: timed out after {timeout:.1f} seconds".encode("utf-8")
+                    ), f"timed out after {timeout:.1f} seconds"
+                if not hedged:
+                    hedged = True
+                    _launch()
+                continue
+
+            finished += 1
+            if result.returncode == 0:
+                return result, "ok" if index == 0 else "ok (hedged copy)"
+            if finished == len(procs):
+                return result, f"exit code {result.returncode}"
+    finally:
+        _stop()
+
+def runwithretries(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = False
+        ) -> Tuple[CompletedProcess[bytes], List[AttemptType]]:
+    '''
+    runs cmd within --timeout seconds, retries included. failures that istransient() recognises are retried
+    up to --retries times with jittered exponential backoff, and fetches that stall for --hedge seconds
+    get a second copy racing the first. returns the last result and every attempt
+    '''
+    cmdstr: str = list2cmdline(cmd)
+    timeout: Optional[float] = getattr(flags, "timeout", None)
+    retries: int = getattr(flags, "retries", DEFAULTRETRIES)
+    hedge: Optional[float] = getattr(flags, "hedge", None) if ishedgeable(cmd) else None
+    deadline: Optional[float] = time() + timeout if timeout else None
+
+    attempts: List[AttemptType] = []
+    while True:
+        remaining: Optional[float] = deadline - time() if deadline else None
+        animation = startloadinganimation(GITCOMMANDMESSAGES.get(getsubcommand(cmd), f"executing {cmdstr}...")) if withprogress else None
+        start: float = time()
+        result, outcome = _attempt(cmd, remaining, hedge)
+        if animation:
+            stoploadinganimation(animation)
+        attempts.append({"attempt": len(attempts) + 1, "duration": time() - start, "outcome": outcome})
+
+        if result.returncode == 0 or len(attempts) > retries:
+            break
+        if result.returncode == TIMEOUTCODE or not istransient(result.stderr.decode('utf-8', errors='replace')):
+            break
+        delay: float = getbackoff(len(attempts))
+        if deadline and time() + delay >= deadline:
+            break
+        warning(f"    ! attempt {len(attempts)} failed ({outcome}), retrying in {delay:.1f}s", pbar)
+        sleep(delay)
+    return result, attempts
+
+def runnetworkcmd(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = True,
+        printsuccess: bool = True
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''
+    runs a command that talks to a remote with the deadline, retries and hedging of runwithretries.
+    returns an AttemptedProcess so the report can show every attempt
+    '''
+    if not cmd:
+        return None
+
+    cmdstr: str = list2cmdline(cmd)
+    if flags.dry:
+        printcmd(cmdstr, pbar)
+        return None
+
+    info("    running command:", pbar)
+    printcmd(f"      $ {cmdstr}", pbar)
+
+    result, attempts = runwithretries(cmd, flags, pbar, withprogress)
+    if result.returncode == 0:
+        # printoutput moves the bar it gets to 80, which is meant for runcmd's inner bar, not the pipeline's
+        printoutput(result, flags, None, pbar)
+        if printsuccess:
+            success("    ✓ completed successfully", pbar)
+        return AttemptedProcess(result, attempts)
+
+    failstep(result.returncode, flags, pbar, [(result.returncode, cmdstr, result.stdout, result.stderr)])
+    return AttemptedProcess(result, attempts)
+
+def runpushes(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = True
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''pushes the current branch to every --push-to remote concurrently, each with its own retries within --timeout'''
+    if not cmd:
+        return None
+
+    def _push(pushcmd: List[str]) -> CompletedProcess[bytes]:
+        return runwithretries(pushcmd, flags, pbar)[0]
+
+    remotes: List[str] = getpushremotes(flags)
+    return runparallel(
+        cmds={remote: cmd + [remote, "HEAD"] for remote in remotes},
+        jobs=len(remotes),
+        flags=flags,
+        pbar=pbar,
+        runner=_push
+    )
@@ -0,0 +1,163 @@
+from time import time
+from tqdm import tqdm
+from argparse import Namespace
+from collections.abc import Callable
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from helpers import completebar, pushcommand, statuscommand, submodulesupdatecommand, stashcommand, pullcommand, \
+    stagecommand, diffcommand, commitcommand, pulldiffcommand, runcmd, incrementprogress, runsubmodulesupdate
+from reports import StepReport, succeeded
+
+if TYPE_CHECKING:
+    from checkpoint import Checkpoint
+
+try:
+    import cython # type: ignore
+except ImportError:
+    import cythonshim as cython # type: ignore
+
+'''
+pipeline steps and the pipeline that runs them, shared by the cli and api
+'''
+
+@cython.cclass
+class PipelineStep:
+    '''step in the pipeline'''
+    name = cython.declare(str, visibility="public")
+    func = cython.declare(object, visibility="public")
+    nopbar = cython.declare(cython.bint, visibility="public")
+    runner = cython.declare(object, visibility="public") # runs the command func returns, same signature as runcmd
+
+    def __init__(
+            self,
+            name: str,
+            func: Callable[[Namespace, Optional[tqdm]], Tuple[int, List[str]]],
+            nopbar: bool = False,
+            runner: Callable[..., Optional[CompletedProcess[bytes]]] = runcmd
+            ):
+        self.name = name
+        self.func = func
+        self.nopbar = nopbar
+        self.runner = runner
+
+    def execute(self, args: Namespace, pbar: Optional[tqdm]) -> Tuple[StepReport, int]:
+        '''execute the step'''
+        start: cython.double = time()
+        toadd, cmd = self.func(args, pbar=pbar) # type: ignore
+
+        result: Optional[CompletedProcess[bytes]] = self.runner(
+            cmd=cmd,
+            flags=args,
+            pbar=pbar,
+            withprogress=not self.nopbar
+        )
+        duration: cython.double = time() - start
+        # runners return None when there was nothing to run, so a command that ran without a result was cut short
+        ran: cython.bint = bool(cmd) and not args.dry
+        report: StepReport = StepReport(
+            step=self.name,
+            command=" ".join(cmd) if cmd else "",
+            duration=duration,
+            output=result.stdout.decode("utf-8", errors="replace") if result else "",
+            returncode=result.returncode if result is not None else (1 if ran else None),
+            attempts=getattr(result, "attempts", None)
+        )
+        return report, toadd
+    
+class Pipeline:
+    '''pipeline'''
+    def __init__(self, args: Namespace, steps: List[PipelineStep], pbar: Optional[tqdm], checkpoint: Optional["Checkpoint"] = None):
+        self.args = args
+        self.steps = steps
+        self.pbar = pbar
+        self.checkpoint = checkpoint
+        self.report: List[StepReport] = []
+
+    @property
+    def failures(self) -> List[StepReport]:
+        '''the steps that ran and failed, including those --continue went past'''
+        return [item for item in self.report if not succeeded(item)]
+
+    def ownsrepo(self) -> bool:
+        '''whether no other meow run can be changing the repo, which --coordinate allows once this run is pushing'''
+        coordinator = getattr(self.args, "coordinator", None)
+        return coordinator is None or coordinator.pipelinelock.held
+
+    def run(self) -> None:
+        '''loops through items in self.steps and runs them'''
+        starttime = time()
+        for step in self.steps:
+            reportitem, toadd = step.execute(self.args, self.pbar)
+            if self.pbar is None:
+                self.report.append(reportitem)
+            else:
+                with incrementprogress(self.pbar, by=toadd):
+                    self.report.append(reportitem)
+            # only the unbroken run of successful steps from the start is finished: after a failure under
+            # --continue, later steps ran without what the failed one should have done, e.g. a push with no new commit
+            if self.checkpoint and not self.failures:
+                self.checkpoint.record(reportitem, readstate=self.ownsrepo())
+        if self.checkpoint and not self.failures:
+            self.checkpoint.clear()
+        totaltime = time() - starttime
+        self.report.append(StepReport(step="TOTAL", duration=totaltime))
+        if self.pbar is not None:
+            completebar(self.pbar, self.pbar.total)
+
+def getsteps(args: Namespace) -> List[PipelineStep]:
+    '''
+    gets the commands the program has to complete. the runners of optional steps are imported
+    in their branch, so a run only loads the modules it uses
+    '''
+    steps: List[PipelineStep] = []
+
+    # get status
+    if args.status:
+        steps.append(PipelineStep("get status", statuscommand, nopbar=True))
+
+    # update submodules
+    if args.updatesubmodules:
+        steps.append(PipelineStep("update submodules", submodulesupdatecommand, runner=runsubmodulesupdate))
+
+    # stash
+    if args.stash:
+        steps.append(PipelineStep("stash changes", stashcommand))
+    
+    # pull
+    if args.pull or args.norebase:
+        from network import runnetworkcmd
+        pull = pullcommand
+        if args.prefetch:
+            from prefetch import prefetchedpullcommand
+            pull = prefetchedpullcommand
+        steps.append(PipelineStep("pull from remote", pull, runner=runnetworkcmd))
+        steps.append(PipelineStep("get pull diff", pulldiffcommand, nopbar=True))
+    
+    # stage changes
+    steps.append(PipelineStep("stage changes", stagecommand))
+    if args.diff:
+        steps.append(PipelineStep("get diff", diffcommand, nopbar=True))
+    
+    # check staged files
+    if args.check:
+        from checks import checkscommand, runchecks
+        steps.append(PipelineStep("check staged files", checkscommand, runner=runchecks))
+
+    # commit changes
+    steps.append(PipelineStep("commit changes", commitcommand))
+
+    # check what will be pushed
+    if args.preflight and not args.nopush:
+        from preflight import preflightcommand, runpreflight
+        steps.append(PipelineStep("preflight checks", preflightcommand, runner=runpreflight))
+
+    # push
+    if not args.nopush:
+        from network import runnetworkcmd, runpushes
+        push = runpushes if args.pushto else runnetworkcmd
+        if args.coordinate and not args.pushto:
+            from coordinator import runcoalescedpush
+            push = runcoalescedpush
+        steps.append(PipelineStep("push changes", pushcommand, runner=push))
+    
+    return steps
@@ -0,0 +1,94 @@
+from tqdm import tqdm
+from time import time
+from colorama import Fore
+from argparse import Namespace
+from os import environ, makedirs, utime
+from os.path import dirname, getmtime, exists
+from typing import List, Tuple, Optional
+from subprocess import Popen, DEVNULL
+from loggers import info
+from helpers import getgitoutput, getgitpath, pullcommand
+from network import runwithretries
+
+'''
+background prefetching for --pull
+'''
+
+PREFETCHCMD: List[str] = ["git", "fetch", "--all", "--prune", "--quiet", "--no-write-fetch-head"]
+
+def prefetchisdue(stamp: str, interval: int) -> bool:
+    '''whether the last prefetch of this repo is older than interval seconds'''
+    return not exists(stamp) or time() - getmtime(stamp) >= interval
+
+def startprefetch(interval: int, pbar: Optional[tqdm] = None) -> bool:
+    '''
+    starts a detached `git fetch` into the remote-tracking refs, at most once per interval per repo.
+    returns whether a fetch was started
+    '''
+    stamp: Optional[str] = getgitpath("meow/prefetch")
+    if stamp is None or not prefetchisdue(stamp, interval):
+        return False
+
+    makedirs(dirname(stamp), exist_ok=True)
+    with open(stamp, 'a'):
+        utime(stamp)
+
+    # never prompt for credentials from the background
+    env = {**environ, "GIT_TERMINAL_PROMPT": "0"}
+    Popen(PREFETCHCMD, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, env=env, start_new_session=True)
+    info(f"    i {Fore.CYAN}prefetching from remotes in the background", pbar)
+    return True
+
+def getupstream() -> Optional[Tuple[str, str, str]]:
+    '''(remote, remote branch ref, remote-tracking ref) of the current branch's upstream'''
+    branch: Optional[str] = getgitoutput(["git", "symbolic-ref", "-q", "HEAD"])
+    if not branch:
+        return None
+    upstream: Optional[str] = getgitoutput([
+        "git", "for-each-ref", "--format=%(upstream:remotename)%00%(upstream:remoteref)%00%(upstream)", branch
+    ])
+    if not upstream:
+        return None
+    parts: List[str] = upstream.split('\0')
+    if len(parts) != 3 or not all(parts):
+        return None
+    return parts[0], parts[1], parts[2]
+
+def getprefetchedupstream(flags: Namespace, pbar: Optional[tqdm] = None) -> Tuple[Optional[str], bool]:
+    '''
+    returns the remote-tracking ref of the upstream if it already matches the remote,
+    i.e. nothing was pushed since the last prefetch, and whether the two could be compared at all.
+    costs one ls-remote instead of a fetch, with the --timeout and --retries of the pull
+    '''
+    upstream: Optional[Tuple[str, str, str]] = getupstream()
+    if upstream is None:
+        return None, False
+    remote, remoteref, trackingref = upstream
+
+    local: Optional[str] = getgitoutput(["git", "rev-parse", "--verify", "-q", trackingref])
+    result, _ = runwithretries(["git", "ls-remote", "--exit-code", remote, remoteref], flags, pbar)
+    remotetip: str = result.stdout.decode('utf-8', errors='replace').strip() if result.returncode == 0 else ""
+    if not local or not remotetip:
+        return None, False
+    return (trackingref if remotetip.split()[0] == local else None), True
+
+def prefetchedpullcommand(
+        args: Namespace,
+        pbar: Optional[tqdm]
+        ) -> Tuple[int, List[str]]:
+    '''gets command for git pull, pulling from the local remote-tracking ref when the prefetch is current'''
+    toadd, cmd = pullcommand(args, pbar)
+    # a dry run only prints commands, so it doesn't ask the remote either
+    if not cmd or args.dry:
+        return toadd, cmd
+
+    trackingref, compared = getprefetchedupstream(args, pbar)
+    if not compared:
+        info(f"    i {Fore.CYAN}couldn't compare the upstream with the last prefetch, fetching", pbar)
+        return toadd, cmd
+    if trackingref is None:
+        info(f"    i {Fore.CYAN}remote changed since the last prefetch, fetching", pbar)
+        return toadd, cmd
+
+    info(f"    i {Fore.CYAN}remote unchanged since the last prefetch, pulling locally", pbar)
+    return toadd, cmd + [".", trackingref]
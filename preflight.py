@@ -0,0 +1,155 @@
+from re import Pattern, compile as compileregex
+from time import time
+from tqdm import tqdm
+from colorama import Fore, Style
+from argparse import Namespace
+from typing import IO, Dict, List, Optional, Tuple
+from subprocess import Popen, PIPE, DEVNULL, list2cmdline, CompletedProcess
+from loggers import error, info, success, printcmd
+from helpers import MinimalNamespace, failstep, getjobs
+from clone import formatsize
+
+'''
+checks on the objects a push is about to send, for --preflight
+'''
+
+BATCHCHECKFORMAT: str = "--batch-check=%(objectname) %(objecttype) %(objectsize) %(rest)"
+MAXSCANSIZE: int = 1024 ** 2 # larger blobs are data, not config files with secrets in them
+SCANBATCH: int = 256 # blobs per worker task
+
+SECRETPATTERNS: Dict[str, Pattern] = {
+    "private key": compileregex(rb"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP |ENCRYPTED )?PRIVATE KEY-----"),
+    "aws access key": compileregex(rb"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b"),
+    "github token": compileregex(rb"\bgh[pousr]_[A-Za-z0-9]{36,}\b"),
+    "slack token": compileregex(rb"\bxox[abposr]-[A-Za-z0-9-]{10,}"),
+    "google api key": compileregex(rb"\bAIza[0-9A-Za-z_-]{35}\b"),
+    "generic secret": compileregex(rb"(?i)\b(?:api[_-]?key|secret|passw(?:or)?d|token)\b[\"']?\s*[:=]\s*[\"'][^\"'\s]{12,}[\"']"),
+}
+
+def readblob(stdout: IO[bytes]) -> Optional[Tuple[str, bytes]]:
+    '''reads one (sha, content) from `git cat-file --batch`, None for a missing object'''
+    header: List[bytes] = stdout.readline().split()
+    if len(header) != 3:
+        return None
+    content: bytes = stdout.read(int(header[2]))
+    stdout.read(1) # trailing newline
+    return header[0].decode(), content
+
+def scanblobs(batch: List[Tuple[str, str]]) -> List[Tuple[str, str, int]]:
+    '''
+    worker: reads the blobs of batch with its own `git cat-file --batch` and returns (path, secret kind, line)
+    for each match. binary blobs are skipped
+    '''
+    findings: List[Tuple[str, str, int]] = []
+    proc: Popen = Popen(["git", "cat-file", "--batch"], stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+    assert proc.stdin is not None and proc.stdout is not None
+    proc.stdin.write("".join(f"{sha}\n" for sha, _ in batch).encode())
+    proc.stdin.close()
+    for _, path in batch:
+        blob: Optional[Tuple[str, bytes]] = readblob(proc.stdout)
+        if blob is None or b"\0" in blob[1][:8000]:
+            continue
+        for kind, pattern in SECRETPATTERNS.items():
+            for match in pattern.finditer(blob[1]):
+                findings.append((path, kind, blob[1].count(b"\n", 0, match.start()) + 1))
+    proc.wait()
+    return findings
+
+def preflightcommand(
+        args: Namespace,
+        pbar: Optional[tqdm]
+        ) -> Tuple[int, List[str]]:
+    '''gets command listing the objects no remote has yet'''
+    if args.preflight:
+        info("\nchecking what will be pushed", pbar)
+        if pbar:
+            pbar.update(1)
+        return 1, ["git", "rev-list", "--objects", "HEAD", "--not", "--remotes"]
+    return 0, []
+
+def runpreflight(
+        cmd: List[str],
+        flags: Namespace = MinimalNamespace,
+        pbar: Optional[tqdm] = None,
+        withprogress: bool = True
+        ) -> Optional[CompletedProcess[bytes]]:
+    '''
+    streams the objects of cmd into one `git cat-file --batch-check`, flags blobs over --max-blob-size
+    and, with --scan-secrets, scans the new text blobs for secrets in a process pool.
+    blocks the push when something is found, unless --continue is given
+    '''
+    if not cmd:
+        return None
+    if flags.dry:
+        printcmd(f"{list2cmdline(cmd)} | git cat-file '{BATCHCHECKFORMAT}'", pbar)
+        return None
+
+    start: float = time()
+    maxsize: int = int(getattr(flags, "maxblobsize", 50) * 1024 ** 2)
+    scansecrets: bool = getattr(flags, "scansecrets", False)
+
+    # rev-list writes "sha path", and %(rest) hands the path back, so nothing is buffered in between
+    revlist: Popen = Popen(cmd, stdout=PIPE, stderr=DEVNULL)
+    catfile: Popen = Popen(["git", "cat-file", BATCHCHECKFORMAT], stdin=revlist.stdout, stdout=PIPE, stderr=DEVNULL)
+    assert revlist.stdout is not None and catfile.stdout is not None
+    revlist.stdout.close()
+
+    objects: int = 0
+    totalsize: int = 0
+    largest: Tuple[int, str] = (0, "")
+    oversized: List[Tuple[str, int]] = []
+    toscan: List[Tuple[str, str]] = []
+    for line in catfile.stdout:
+        parts: List[str] = line.decode('utf-8', errors='replace').rstrip('\n').split(' ', 3)
+        if len(parts) < 3 or not parts[2].isdigit():
+            continue
+        objects += 1
+        size: int = int(parts[2])
+        totalsize += size
+        if parts[1] != "blob":
+            continue
+        path: str = parts[3] if len(parts) == 4 else parts[0]
+        largest = max(largest, (size, path))
+        if size > maxsize:
+            oversized.append((path, size))
+        elif scansecrets and size <= MAXSCANSIZE:
+            toscan.append((parts[0], path))
+    catfile.wait()
+    revlist.wait()
+
+    findings: List[Tuple[str, str, int]] = []
+    if toscan:
+        batches: List[List[Tuple[str, str]]] = [toscan[i:i + SCANBATCH] for i in range(0, len(toscan), SCANBATCH)]
+        if len(batches) == 1:
+            # a pool costs more to start than one batch takes to scan
+            findings = scanblobs(batches[0])
+        else:
+            # regex scanning is cpu bound, so it needs processes rather than threads.
+            # imported here since multiprocessing is slow to load and most pushes never get this far
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(getjobs(flags), len(batches))) as executor:
+                for batchfindings in executor.map(scanblobs, batches):
+                    findings.extend(batchfindings)
+
+    duration: float = time() - start
+    lines: List[str] = [f"{objects} objects, {formatsize(totalsize)} to push"]
+    if largest[1]:
+        lines.append(f"largest file: {largest[1]} ({formatsize(largest[0])})")
+    if scansecrets:
+        lines.append(f"scanned {len(toscan)} files for secrets")
+    lines.extend(f"too large: {path} ({formatsize(size)})" for path, size in oversized)
+    lines.extend(f"possible {kind}: {path}:{line}" for path, kind, line in findings)
+    summary: bytes = "\n".join(lines).encode("utf-8")
+
+    if not oversized and not findings:
+        success(f"    ✓ {objects} objects, {formatsize(totalsize)} {Style.DIM}({duration:.2f}s)", pbar)
+        return CompletedProcess(args=cmd, returncode=0, stdout=summary, stderr=b"")
+
+    error("\n❌ preflight found problems in the commits about to be pushed:", pbar)
+    for path, size in oversized:
+        error(f"    ✗ {path} is {formatsize(size)}, over the {formatsize(maxsize)} limit (--max-blob-size)", pbar)
+    for path, kind, line in findings:
+        error(f"    ✗ possible {kind} in {path}:{line}", pbar)
+    error(f"{Fore.RED}remove them from the unpushed commits (e.g. git reset --soft @{{upstream}}) before pushing", pbar)
+    failstep(1, flags, pbar)
+    return CompletedProcess(args=cmd, returncode=1, stdout=summary, stderr=b"")
@@ -0,0 +1,64 @@
+from typing import List, Optional, Dict, Union
+
+try:
+    import cython # type: ignore
+except ImportError:
+    import cythonshim as cython # type: ignore
+
+'''
+report records and formatting
+'''
+
+@cython.cclass
+class StepReport:
+    '''what happened in one pipeline step'''
+    step = cython.declare(str, visibility="public")
+    command = cython.declare(object, visibility="public") # None for summary rows like TOTAL
+    duration = cython.declare(cython.double, visibility="public")
+    output = cython.declare(str, visibility="public")
+    returncode = cython.declare(object, visibility="public") # None if nothing ran
+    attempts = cython.declare(list, visibility="public")
+
+    def __init__(
+            self,
+            step: str,
+            command: Optional[str] = None,
+            duration: float = 0.0,
+            output: str = "",
+            returncode: Optional[int] = None,
+            attempts: Optional[List[Dict[str, Union[int, float, str]]]] = None
+            ):
+        self.step = step
+        self.command = command
+        self.duration = duration
+        self.output = output
+        self.returncode = returncode
+        self.attempts = attempts if attempts is not None else []
+
+    def __repr__(self) -> str:
+        return f"StepReport(step={self.step!r}, duration={self.duration:.8f}, returncode={self.returncode!r})"
+
+def succeeded(report: StepReport) -> bool:
+    '''whether a step had nothing to run or exited with 0. a step whose command ran always has a return code'''
+    return not report.returncode
+
+@cython.ccall
+def formatreport(report: list, totaltime: cython.double) -> list:
+    '''assembles the lines of the report'''
+    output: list = ["\n", "report:\n"]
+    step: StepReport
+    for step in report:
+        output.append(f"step: {step.step}\n")
+        output.append(f"  command: {step.command if step.command is not None else 'N/A'}\n")
+        output.append(f"  duration: {step.duration:.8f} seconds\n")
+        if step.output:
+            output.append(f"  output: {step.output}\n")
+        if step.returncode:
+            output.append(f"  return code: {step.returncode}\n")
+        if step.attempts:
+            output.append("  attempts:\n")
+            for attempt in step.attempts:
+                output.append(f"    {attempt['attempt']}: {attempt['outcome']} ({attempt['duration']:.8f} seconds)\n")
+        output.append("\n")
+    output.append(f"total duration: {totaltime:.8f} seconds\n")
+    return output
@@ -6,28 +6,40 @@ os.makedirs("temp", exist_ok=True)
 
 CFLAGS = ["-Os", "-flto", "-s"]
 
+# every module of the cli, in import order. cythonshim is left out on purpose:
+# compiled modules resolve `import cython` at compile time and never load it
+MODULES = [
+    "loaders",
+    "loggers",
+    "errors",
+    "reports",
+    "helpers",
+    "network",
+    "clone",
+    "prefetch",
+    "watcher",
+    "tune",
+    "sshmux",
+    "checks",
+    "preflight",
+    "checkpoint",
+    "maintenance",
+    "coordinator",
+    "pipeline",
+    "githandler",
+    "main",
+    "api",
+]
+
 extensions = [
     Extension(
-        "helpers",
-        ["helpers.py"],
+        module,
+        [f"{module}.py"],
         include_dirs=["/usr/include/python3.13"],
         extra_compile_args=CFLAGS,
         extra_link_args=CFLAGS + ["-s"],
-    ),
-    Extension(
-        "loaders", 
-        ["loaders.py"], 
-        include_dirs=["/usr/include/python3.13"],
-        extra_compile_args=CFLAGS,
-        extra_link_args=CFLAGS + ["-s"]
-    ),
-    Extension(
-        "loggers", 
-        ["loggers.py"], 
-        include_dirs=["/usr/include/python3.13"],
-        extra_compile_args=CFLAGS,
-        extra_link_args=CFLAGS + ["-s"]
     )
+    for module in MODULES
 ]
 
 setup(
@@ -48,4 +60,4 @@ setup(
     author="luna",
     author_email="luna@hackclub.app",
 
-)
\ No newline at end of file
+)
@@ -0,0 +1,107 @@
+from sys import exit
+from tqdm import tqdm
+from shlex import quote
+from shutil import rmtree
+from tempfile import mkdtemp
+from os import environ, listdir
+from os.path import join, exists
+from typing import Callable, Dict, Optional, Tuple, Union
+from signal import signal, getsignal, SIGTERM, SIGHUP, Handlers
+from subprocess import run as runsubprocess, CompletedProcess, DEVNULL
+from loggers import info
+from reports import StepReport
+
+'''
+shared ssh connections for --ssh-mux
+'''
+
+PERSIST: int = 60 # seconds a master outlives its last client, in case stop() never runs
+LOGFILE: str = "ssh.log"
+
+# printed to the -E log at LogLevel DEBUG1
+HANDSHAKEMARKER: str = "Authenticated to "
+SESSIONMARKER: str = "mux_client_request_session: master session id"
+
+SignalHandler = Union[Callable[..., object], int, Handlers, None]
+
+def getbasesshcommand() -> str:
+    '''the ssh command git would use without meow: GIT_SSH_COMMAND, core.sshCommand, GIT_SSH, or plain ssh'''
+    if environ.get("GIT_SSH_COMMAND"):
+        return environ["GIT_SSH_COMMAND"]
+    result: CompletedProcess[bytes] = runsubprocess(["git", "config", "--get", "core.sshCommand"], check=False, capture_output=True)
+    configured: str = result.stdout.decode('utf-8', errors='replace').strip()
+    if result.returncode == 0 and configured:
+        return configured
+    if environ.get("GIT_SSH"):
+        return quote(environ["GIT_SSH"])
+    return "ssh"
+
+class SshMultiplexer:
+    '''
+    points every git child of this process at one ssh control master per host,
+    so pull, push and each submodule reuse a connection instead of doing their own handshake
+    '''
+    def __init__(self):
+        self.directory: Optional[str] = None
+        self.previous: Optional[str] = None
+        self.command: Optional[str] = None
+        self.connections: Tuple[int, int] = (0, 0)
+        self.handlers: Dict[int, SignalHandler] = {}
+
+    def start(self, pbar: Optional[tqdm] = None) -> None:
+        '''sets GIT_SSH_COMMAND for child processes'''
+        # %C is a short hash of host, port and user, keeping the socket path under the unix socket limit
+        self.directory = mkdtemp(prefix="meow-ssh-")
+        self.previous = environ.get("GIT_SSH_COMMAND")
+        self.command = (
+            f"{getbasesshcommand()} -o ControlMaster=auto -o ControlPath={quote(join(self.directory, '%C'))}"
+            f" -o ControlPersist={PERSIST} -o LogLevel=DEBUG1 -E {quote(join(self.directory, LOGFILE))}"
+        )
+        environ["GIT_SSH_COMMAND"] = self.command
+        # a terminated run still closes its masters
+        for signum in (SIGTERM, SIGHUP):
+            self.handlers[signum] = getsignal(signum)
+            signal(signum, lambda signum, frame: exit(128 + signum))
+        info("    i sharing ssh connections between steps", pbar)
+
+    def countconnections(self) -> Tuple[int, int]:
+        '''(new connections, reused connections) from the ssh log'''
+        if self.directory is None or not exists(join(self.directory, LOGFILE)):
+            return 0, 0
+        with open(join(self.directory, LOGFILE), errors='replace') as f:
+            log: str = f.read()
+        handshakes: int = log.count(HANDSHAKEMARKER)
+        # with ControlPersist the process that opened a master also becomes its first client
+        sessions: int = log.count(SESSIONMARKER)
+        return handshakes, max(0, sessions - handshakes)
+
+    def report(self) -> StepReport:
+        '''report row with the connection counts, after stop()'''
+        handshakes, reused = self.connections
+        return StepReport(
+            step="ssh connections",
+            command=self.command,
+            output=f"{handshakes} handshakes, {reused} reused connections"
+        )
+
+    def stop(self) -> None:
+        '''closes every master, removes the sockets and restores GIT_SSH_COMMAND'''
+        if self.directory is None:
+            return
+        self.connections = self.countconnections()
+        for name in listdir(self.directory):
+            if name != LOGFILE:
+                runsubprocess(
+                    ["ssh", "-o", f"ControlPath={join(self.directory, name)}", "-O", "exit", "meow"],
+                    stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, check=False
+                )
+        rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+        if self.previous is None:
+            environ.pop("GIT_SSH_COMMAND", None)
+        else:
+            environ["GIT_SSH_COMMAND"] = self.previous
+        for signum, handler in self.handlers.items():
+            signal(signum, handler)
+        self.handlers = {}
@@ -0,0 +1,236 @@
+from sys import exit
+from time import time
+from colorama import Fore, Style
+from statistics import median
+from os import lstat
+from argparse import ArgumentParser, Namespace
+from typing import Callable, Dict, List, Optional, Tuple
+from subprocess import list2cmdline, run as runsubprocess, CompletedProcess, DEVNULL
+from loggers import error, info, success, warning
+from reports import StepReport, formatreport
+from helpers import getgitoutput, runcmd
+
+'''
+meow tune: measures a repo and enables the git settings that make it faster
+'''
+
+MetricsType = Dict[str, int]
+TimingsType = Dict[str, float]
+
+# read-only stand-ins for the commands meow runs, so measuring never changes the repo
+TIMEDCOMMANDS: Dict[str, List[str]] = {
+    "status": ["git", "status", "--porcelain"],
+    "add": ["git", "add", "--all", "--dry-run"],
+    "commit": ["git", "commit", "--dry-run", "--allow-empty", "--quiet"],
+}
+
+class TuneSetting:
+    '''a git setting meow tune can turn on'''
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            configs: List[Tuple[str, str]],
+            commands: List[List[str]],
+            recommended: Callable[[MetricsType], bool],
+            supported: Callable[[], bool] = lambda: True
+            ):
+        self.name = name
+        self.description = description
+        self.configs = configs
+        self.commands = commands # run after setting the config, to apply it right away
+        self.recommended = recommended
+        self.supported = supported
+
+def hasbuiltinfsmonitor() -> bool:
+    '''whether this git has the builtin fsmonitor daemon (not available on every platform)'''
+    return "fsmonitor--daemon" in (getgitoutput(["git", "version", "--build-options"]) or "")
+
+SETTINGS: List[TuneSetting] = [
+    TuneSetting(
+        "untracked cache",
+        "caches untracked directory listings between git status runs",
+        [("core.untrackedCache", "true")],
+        [["git", "update-index", "--untracked-cache"]],
+        lambda m: m["files"] >= 10000 or m["untracked"] >= 1000
+    ),
+    TuneSetting(
+        "fsmonitor",
+        "asks a filesystem watcher what changed instead of scanning the work tree",
+        [("core.fsmonitor", "true")],
+        [],
+        lambda m: m["files"] >= 20000,
+        hasbuiltinfsmonitor
+    ),
+    TuneSetting(
+        "many files index",
+        "smaller index format for repos with many files",
+        [("feature.manyFiles", "true")],
+        [["git", "update-index", "--index-version", "4"]],
+        lambda m: m["files"] >= 100000
+    ),
+    TuneSetting(
+        "commit graph",
+        "precomputed commit graph for faster history walks",
+        [("core.commitGraph", "true"), ("fetch.writeCommitGraph", "true")],
+        [["git", "commit-graph", "write", "--reachable", "--changed-paths"]],
+        lambda m: m["commits"] >= 1000
+    ),
+    TuneSetting(
+        "multi-pack index",
+        "one index over all packfiles instead of searching each",
+        [("core.multiPackIndex", "true")],
+        [["git", "multi-pack-index", "write"]],
+        lambda m: m["packs"] >= 5
+    ),
+    TuneSetting(
+        "split index",
+        "writes only changed index entries instead of the whole index",
+        [("core.splitIndex", "true")],
+        [["git", "update-index", "--split-index"]],
+        lambda m: m["files"] >= 100000
+    ),
+]
+
+def measurerepo() -> MetricsType:
+    '''counts what makes git slow: files, commits, packs, loose objects, refs and untracked files'''
+    metrics: MetricsType = {}
+    metrics["files"] = (getgitoutput(["git", "ls-files", "-z"]) or "").count("\0")
+    metrics["commits"] = int(getgitoutput(["git", "rev-list", "--count", "--all"]) or 0)
+    metrics["refs"] = len((getgitoutput(["git", "for-each-ref", "--format=x"]) or "").splitlines())
+
+    for line in (getgitoutput(["git", "count-objects", "-v"]) or "").splitlines():
+        key, _, value = line.partition(": ")
+        if key == "count" and value.isdigit():
+            metrics["looseobjects"] = int(value)
+        elif key == "packs" and value.isdigit():
+            metrics["packs"] = int(value)
+    metrics.setdefault("looseobjects", 0)
+    metrics.setdefault("packs", 0)
+
+    untracked: List[str] = [path for path in (getgitoutput(["git", "ls-files", "-z", "--others", "--exclude-standard"]) or "").split("\0") if path]
+    metrics["untracked"] = len(untracked)
+    metrics["untrackedbytes"] = 0
+    for path in untracked:
+        try:
+            metrics["untrackedbytes"] += lstat(path).st_size
+        except OSError:
+            pass
+    return metrics
+
+def timegit(runs: int) -> TimingsType:
+    '''median time of each TIMEDCOMMANDS command, after one warm-up run'''
+    timings: TimingsType = {}
+    for name, cmd in TIMEDCOMMANDS.items():
+        runsubprocess(cmd, stdout=DEVNULL, stderr=DEVNULL, check=False)
+        samples: List[float] = []
+        for _ in range(runs):
+            start: float = time()
+            runsubprocess(cmd, stdout=DEVNULL, stderr=DEVNULL, check=False)
+            samples.append(time() - start)
+        timings[name] = median(samples)
+    return timings
+
+def formattimings(before: TimingsType, after: TimingsType) -> str:
+    '''one line per command: before -> after (speedup)'''
+    lines: List[str] = []
+    for name in TIMEDCOMMANDS:
+        speedup: float = before[name] / after[name] if after[name] > 0 else 1.0
+        lines.append(f"{name}: {before[name]:.4f}s -> {after[name]:.4f}s ({speedup:.2f}x)")
+    return "\n".join(lines)
+
+def isenabled(setting: TuneSetting) -> bool:
+    '''whether every config of setting is already set'''
+    return all(
+        getgitoutput(["git", "config", "--get", key]) == value
+        for key, value in setting.configs
+    )
+
+def confirm(question: str) -> bool:
+    '''asks a yes/no question, defaulting to no'''
+    try:
+        return input(f"{Fore.CYAN}{question} [y/N] {Style.RESET_ALL}").strip().lower() in ("y", "yes")
+    except EOFError:
+        return False
+
+def applysetting(setting: TuneSetting, flags: Namespace) -> bool:
+    '''sets the configs and runs the commands of a setting. returns whether everything succeeded'''
+    cmds: List[List[str]] = [["git", "config", key, value] for key, value in setting.configs] + setting.commands
+    for cmd in cmds:
+        result: Optional[CompletedProcess[bytes]] = runcmd(cmd=cmd, flags=flags, withprogress=False, printsuccess=False)
+        if (result is None and not flags.dry) or (result is not None and result.returncode != 0):
+            return False
+    return True
+
+def tune(args: Namespace) -> List[StepReport]:
+    '''measures the repo, offers each recommended setting, and reports the speedup of each one'''
+    flags: Namespace = Namespace(cont=True, dry=args.dry, verbose=False, quiet=True, message="")
+    report: List[StepReport] = []
+
+    metrics: MetricsType = measurerepo()
+    info(f"{Style.BRIGHT}repository:")
+    for key, value in metrics.items():
+        info(f"    {key}: {value}")
+
+    baseline: TimingsType = timegit(args.runs)
+    first: TimingsType = baseline
+    info(f"\n{Style.BRIGHT}baseline:")
+    for name, seconds in baseline.items():
+        info(f"    {name}: {seconds:.4f}s")
+    info("")
+
+    for setting in SETTINGS:
+        if not setting.supported():
+            info(f"    - {setting.name}: not supported by this git")
+            continue
+        if isenabled(setting):
+            info(f"    - {setting.name}: already enabled")
+            continue
+        if not args.all and not setting.recommended(metrics):
+            info(f"    - {setting.name}: not needed for a repo this size")
+            continue
+        if not args.yes and not args.dry and not confirm(f"enable {setting.name} ({setting.description})?"):
+            continue
+
+        start: float = time()
+        if not applysetting(setting, flags):
+            warning(f"    ! couldn't enable {setting.name}")
+            continue
+        duration: float = time() - start
+        if args.dry:
+            continue
+
+        after: TimingsType = timegit(args.runs)
+        success(f"    ✓ {setting.name} enabled")
+        for line in formattimings(baseline, after).splitlines():
+            info(f"      {line}")
+        report.append(StepReport(
+            step=f"tune: {setting.name}",
+            command="; ".join(list2cmdline(cmd) for cmd in [["git", "config", key, value] for key, value in setting.configs] + setting.commands),
+            duration=duration,
+            output=formattimings(baseline, after)
+        ))
+        baseline = after
+
+    if report:
+        report.append(StepReport(step="tune: overall", duration=0.0, output=formattimings(first, baseline)))
+    return report
+
+def handletune(tuneargs: List[str]) -> None:
+    '''handles meow tune'''
+    parser: ArgumentParser = ArgumentParser(prog="meow tune", description="measure this repo and enable the git settings that speed it up")
+    parser.add_argument("-y", "--yes", action='store_true', help="enable recommended settings without asking")
+    parser.add_argument("--all", action='store_true', help="offer every setting, not only the recommended ones")
+    parser.add_argument("--runs", type=int, default=3, metavar="N", help="timed runs per command (default: 3)")
+    parser.add_argument("--dry", action='store_true', help="preview commands without execution")
+    args: Namespace = parser.parse_args(tuneargs)
+
+    if runsubprocess(["git", "rev-parse", "--git-dir"], stdout=DEVNULL, stderr=DEVNULL, check=False).returncode != 0:
+        error("error: meow tune has to run inside a git repository")
+        exit(1)
+
+    report: List[StepReport] = tune(args)
+    if report:
+        for line in formatreport(report, sum(step.duration for step in report)):
+            info(line)
+    exit(0)
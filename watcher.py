@@ -0,0 +1,244 @@
+from sys import exit
+from select import select
+from time import time, strftime
+from ctypes.util import find_library
+from colorama import Fore, Style
+from ctypes import CDLL, get_errno
+from struct import calcsize, unpack_from
+from argparse import ArgumentParser, Namespace
+from typing import Dict, List, Set, Tuple, Optional, Final
+from os import chdir, close, fsdecode, fsencode, listdir, read, strerror
+from os.path import join, isdir, islink, lexists
+from subprocess import run as runsubprocess, CompletedProcess
+from loggers import error, info, success, warning
+from helpers import runcmd
+
+'''
+meow watch: commits changes in the working tree as they happen
+'''
+
+IN_MODIFY: Final[int] = 0x00000002
+IN_ATTRIB: Final[int] = 0x00000004
+IN_CLOSE_WRITE: Final[int] = 0x00000008
+IN_MOVED_FROM: Final[int] = 0x00000040
+IN_MOVED_TO: Final[int] = 0x00000080
+IN_CREATE: Final[int] = 0x00000100
+IN_DELETE: Final[int] = 0x00000200
+IN_Q_OVERFLOW: Final[int] = 0x00004000
+IN_IGNORED: Final[int] = 0x00008000
+IN_ONLYDIR: Final[int] = 0x01000000
+IN_ISDIR: Final[int] = 0x40000000
+IN_NONBLOCK: Final[int] = 0o4000
+IN_CLOEXEC: Final[int] = 0o2000000
+
+WATCHMASK: Final[int] = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+EVENTHEADER: Final[str] = "iIII" # wd, mask, cookie, name length
+EVENTHEADERSIZE: Final[int] = calcsize(EVENTHEADER)
+
+MAXPATHSPECS: Final[int] = 1000 # above this, `git add -A` is cheaper than passing every path
+
+def getignored(paths: List[str]) -> Set[str]:
+    '''paths that .gitignore (or info/exclude, core.excludesFile) excludes. tracked files are never ignored'''
+    if not paths:
+        return set()
+    result: CompletedProcess[bytes] = runsubprocess(
+        ["git", "check-ignore", "--stdin", "-z"],
+        input=b"\0".join(fsencode(path) for path in paths),
+        check=False,
+        capture_output=True
+    )
+    return {fsdecode(path) for path in result.stdout.split(b"\0") if path}
+
+class InotifyWatcher:
+    '''recursive inotify watch on the directories of a work tree that git doesn't ignore'''
+    def __init__(self) -> None:
+        self.libc = CDLL(find_library("c") or "libc.so.6", use_errno=True)
+        self.fd: int = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(get_errno(), f"inotify_init1: {strerror(get_errno())}")
+        self.directories: Dict[int, str] = {} # watch descriptor -> directory relative to the work tree
+
+    def addwatch(self, directory: str) -> bool:
+        '''watches one directory (relative to the work tree)'''
+        wd: int = self.libc.inotify_add_watch(self.fd, fsencode(directory or "."), WATCHMASK)
+        if wd < 0:
+            warning(f"can't watch {directory or '.'}: {strerror(get_errno())} (see fs.inotify.max_user_watches)")
+            return False
+        self.directories[wd] = directory
+        return True
+
+    def addtree(self, directory: str) -> int:
+        '''watches directory and every subdirectory that isn't ignored, one level at a time'''
+        count: int = 0
+        level: List[str] = [directory]
+        while level:
+            nextlevel: List[str] = []
+            for current in level:
+                if not self.addwatch(current):
+                    continue
+                count += 1
+                try:
+                    names: List[str] = listdir(current or ".")
+                except OSError:
+                    continue
+                for name in names:
+                    path: str = join(current, name)
+                    if name != ".git" and isdir(path) and not islink(path):
+                        nextlevel.append(path)
+            ignored: Set[str] = getignored(nextlevel)
+            level = [path for path in nextlevel if path not in ignored]
+        return count
+
+    def readevents(self) -> Tuple[Set[str], bool]:
+        '''reads pending events. returns the changed paths and whether the kernel queue overflowed'''
+        changed: Set[str] = set()
+        newdirectories: List[str] = []
+        overflowed: bool = False
+
+        while True:
+            try:
+                data: bytes = read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset: int = 0
+            while offset < len(data):
+                wd, mask, _, length = unpack_from(EVENTHEADER, data, offset)
+                name: str = fsdecode(data[offset + EVENTHEADERSIZE:offset + EVENTHEADERSIZE + length].rstrip(b"\0"))
+                offset += EVENTHEADERSIZE + length
+
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                    continue
+                if wd not in self.directories or not name or name == ".git":
+                    continue
+
+                path: str = join(self.directories[wd], name)
+                changed.add(path)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    newdirectories.append(path)
+
+        ignored: Set[str] = getignored(newdirectories)
+        for directory in newdirectories:
+            if directory not in ignored and isdir(directory):
+                self.addtree(directory)
+        return changed, overflowed
+
+    def close(self) -> None:
+        close(self.fd)
+
+def snapshot(changed: Set[str], rescan: bool, args: Namespace) -> bool:
+    '''stages exactly the changed paths (or everything after an overflow) and commits. returns whether it committed'''
+    flags: Namespace = Namespace(cont=True, dry=args.dry, verbose=False, quiet=True, message="")
+
+    if rescan or len(changed) > MAXPATHSPECS:
+        runcmd(cmd=["git", "add", "-A"], flags=flags, withprogress=False, printsuccess=False)
+    else:
+        ignored: Set[str] = getignored(sorted(changed))
+        paths: List[str] = sorted(path for path in changed if path not in ignored)
+        existing: List[str] = [path for path in paths if lexists(path)]
+        removed: List[str] = [path for path in paths if not lexists(path)]
+        if existing:
+            runcmd(cmd=["git", "add", "-A", "--", *existing], flags=flags, withprogress=False, printsuccess=False)
+        if removed:
+            runcmd(
+                cmd=["git", "rm", "-r", "--cached", "--ignore-unmatch", "--quiet", "--", *removed],
+                flags=flags, withprogress=False, printsuccess=False
+            )
+
+    if args.dry:
+        return False
+    if runsubprocess(["git", "diff", "--cached", "--quiet"], check=False).returncode == 0:
+        return False # only ignored or unchanged files were touched
+
+    message: str = " ".join(args.message) if args.message else f"meow watch snapshot {strftime('%Y-%m-%d %H:%M:%S')}"
+    result = runcmd(cmd=["git", "commit", "--quiet", "-m", message], flags=flags, withprogress=False, printsuccess=False)
+    if result is None or result.returncode != 0:
+        return False
+    success(f"    ✓ committed {len(changed) if not rescan else 'all'} changed paths")
+    return True
+
+def push(args: Namespace) -> bool:
+    '''pushes the batched snapshot commits. returns whether it succeeded'''
+    flags: Namespace = Namespace(cont=True, dry=args.dry, verbose=False, quiet=True, message="")
+    result = runcmd(cmd=["git", "push", "--quiet"], flags=flags, withprogress=False, printsuccess=False)
+    if result is None or result.returncode != 0:
+        return False
+    success("    ✓ pushed snapshots")
+    return True
+
+def watch(args: Namespace) -> None:
+    '''
+    blocks on inotify until something changes, then commits once the tree has been quiet
+    for args.quietperiod seconds, and pushes at most every args.pushinterval seconds
+    '''
+    toplevel: CompletedProcess[bytes] = runsubprocess(["git", "rev-parse", "--show-toplevel"], check=False, capture_output=True)
+    if toplevel.returncode != 0:
+        error("error: meow watch has to run inside a git repository")
+        exit(1)
+    chdir(fsdecode(toplevel.stdout.strip()))
+
+    try:
+        watcher: InotifyWatcher = InotifyWatcher()
+    except (OSError, AttributeError) as e:
+        error(f"error: meow watch needs inotify (linux only): {e}")
+        exit(1)
+
+    count: int = watcher.addtree("")
+    info(f"watching {Style.BRIGHT}{fsdecode(toplevel.stdout.strip())}{Style.RESET_ALL}{Fore.BLUE} ({count} directories), ctrl+c to stop")
+
+    changed: Set[str] = set()
+    rescan: bool = False
+    lastchange: float = 0.0
+    lastpush: float = time()
+    pending: bool = False
+
+    try:
+        while True:
+            deadlines: List[float] = []
+            if changed or rescan:
+                deadlines.append(lastchange + args.quietperiod)
+            if pending:
+                deadlines.append(lastpush + args.pushinterval)
+            timeout: Optional[float] = max(0.0, min(deadlines) - time()) if deadlines else None
+
+            ready, _, _ = select([watcher.fd], [], [], timeout)
+            if ready:
+                paths, overflowed = watcher.readevents()
+                if paths or overflowed:
+                    changed |= paths
+                    rescan = rescan or overflowed
+                    lastchange = time()
+
+            now: float = time()
+            if (changed or rescan) and now - lastchange >= args.quietperiod:
+                if snapshot(changed, rescan, args) and not args.nopush:
+                    pending = True
+                changed = set()
+                rescan = False
+            if pending and now - lastpush >= args.pushinterval:
+                lastpush = now
+                pending = not push(args)
+    except KeyboardInterrupt:
+        info(f"\n{Fore.CYAN}stopping, saving pending changes...")
+        if (changed or rescan) and snapshot(changed, rescan, args) and not args.nopush:
+            pending = True
+        if pending:
+            push(args)
+    finally:
+        watcher.close()
+
+def handlewatch(watchargs: List[str]) -> None:
+    '''handles meow watch'''
+    parser: ArgumentParser = ArgumentParser(prog="meow watch", description="commit changes as they happen")
+    parser.add_argument("message", nargs='*', help="commit message for snapshots (default: timestamp)")
+    parser.add_argument("--quiet-period", dest="quietperiod", type=float, default=5.0, metavar="SECONDS", help="commit after no changes for this long (default: 5)")
+    parser.add_argument("--push-interval", dest="pushinterval", type=float, default=60.0, metavar="SECONDS", help="push at most this often (default: 60)")
+    parser.add_argument("-np", "--no-push", dest="nopush", action='store_true', help="only commit, never push")
+    parser.add_argument("--dry", action='store_true', help="preview commands without execution")
+    args: Namespace = parser.parse_args(watchargs)
+
+    watch(args)
+    exit(0)